@@ -1,65 +1,134 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
-import sys
 import os
-import traceback
 
 # Import your existing scripts
 # These must be in the same folder as api.py
 import routing
 import inference
+import pipeline
+from dashboard import DEFAULT_PREDICTIONS, TOP_URGENT, get_dashboard_summary
+from fleet_cache import get_fleet_cache, start_fleet_cache, start_fleet_cache_background
+from jobs import QueueFullError, get_job_manager
 
 app = Flask(__name__)
 # Enable CORS so your Vue app (localhost:5173) can talk to this Python app (localhost:5000)
 CORS(app)
 
+# Serve fleet state from memory instead of re-reading the database per job
+USE_FLEET_CACHE = os.environ.get("API_FLEET_CACHE", "1") != "0"
 
-@app.route("/run-optimization", methods=["POST"])
-def run_optimization():
-    try:
-        print("🚀 Triggering Route Optimization...")
-        # This calls the main() function inside routing.py
-        # It will fetch data, calculate TSP, and update Firebase /routes
-        routing.main()
 
+@app.before_request
+def ensure_fleet_cache():
+    # Also covers WSGI servers, which import app without running __main__
+    if USE_FLEET_CACHE and get_fleet_cache() is None:
+        start_fleet_cache_background(inference.HISTORY_LIMIT)
+
+
+def submit_job(kind, fn, message):
+    """Queue fn as a background job and answer 202 with its id"""
+    try:
+        job, created = get_job_manager().submit(kind, fn)
+    except QueueFullError as e:
+        print(f"❌ Job queue full: {e}")
         return (
-            jsonify(
-                {
-                    "status": "success",
-                    "message": "TSP Optimization complete. Routes updated in Firebase.",
-                }
-            ),
-            200,
+            jsonify({"status": "error", "message": "Too many jobs queued. Try again later."}),
+            503,
         )
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        traceback.print_exc()  # Kept this for better debugging
-        return jsonify({"status": "error", "message": "An internal error has occurred."}), 500
+
+    if not created:
+        print(f"↪ Joining in-flight {kind} job {job.id}")
+    return (
+        jsonify(
+            {
+                "status": "accepted",
+                "message": message,
+                "job_id": job.id,
+                "job_url": f"/jobs/{job.id}",
+                "deduplicated": not created,
+            }
+        ),
+        202,
+    )
+
+
+@app.route("/run-optimization", methods=["POST"])
+def run_optimization():
+    print("🚀 Triggering Route Optimization...")
+    # routing.main() fetches data, calculates TSP, and updates Firebase /routes
+    return submit_job(
+        "optimization", routing.main, "TSP Optimization started. Poll job_url for status."
+    )
 
 
 @app.route("/run-inference", methods=["POST"])
 def run_inference():
-    try:
-        print("🧠 Triggering AI Inference...")
-        # This calls the main() function inside inference.py
-        # It will fetch bins, predict time-to-full, and update Firebase /predictions
-        inference.main()
+    print("🧠 Triggering AI Inference...")
+    # inference.main() fetches bins, predicts time-to-full, and updates /predictions
+    return submit_job(
+        "inference", inference.main, "AI Inference started. Poll job_url for status."
+    )
 
-        return (
-            jsonify(
-                {
-                    "status": "success",
-                    "message": "AI Inference complete. Predictions updated in Firebase.",
-                }
-            ),
-            200,
-        )
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        traceback.print_exc()  # Kept this for better debugging
-        return jsonify({"status": "error", "message": "An internal error has occurred."}), 500
+
+@app.route("/run-pipeline", methods=["POST"])
+def run_pipeline():
+    print("🔁 Triggering Inference + Route Optimization...")
+    # pipeline.run_pipeline() predicts and routes in one process, then writes
+    # /predictions and /routes once
+    return submit_job(
+        "pipeline", pipeline.run_pipeline, "Pipeline started. Poll job_url for status."
+    )
+
+
+def conditional_json(payload, etag):
+    """JSON response with an ETag; 304 when the client already has it"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate on every poll
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+@app.route("/dashboard/summary", methods=["GET"])
+def dashboard_summary():
+    # Status-band counts, most urgent bins and the fill-trend chart
+    top_n = request.args.get("top", TOP_URGENT, type=int)
+    return conditional_json(*get_dashboard_summary().overview(top_n))
+
+
+@app.route("/dashboard/urgent", methods=["GET"])
+def dashboard_urgent():
+    limit = request.args.get("limit", TOP_URGENT, type=int)
+    return conditional_json(*get_dashboard_summary().urgent(limit))
+
+
+@app.route("/dashboard/predictions", methods=["GET"])
+def dashboard_predictions():
+    # Bounded per-bin forecast table, soonest full first
+    limit = request.args.get("limit", DEFAULT_PREDICTIONS, type=int)
+    return conditional_json(*get_dashboard_summary().predictions(limit))
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    cache = get_fleet_cache()
+    if cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **cache.stats()}), 200
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job id."}), 404
+    return jsonify(job), 200
 
 
 if __name__ == "__main__":
+    # Warm the cache before serving instead of on the first request
+    if USE_FLEET_CACHE:
+        start_fleet_cache(inference.HISTORY_LIMIT)
     print("🔥 Smart Waste ML Server running on http://localhost:5000")
     app.run(port=5000)
\ No newline at end of file
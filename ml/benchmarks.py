@@ -0,0 +1,655 @@
+"""
+Benchmark Script
+Runs the performance benchmarks for the ML pipeline on synthetic data.
+No Firebase connection is needed.
+
+Usage:
+  python benchmarks.py [fill-rate] [pipeline] [distance-matrix] [tsp] [clusters]
+                       [spatial-index] [features] [dataset]
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+from ortools.constraint_solver import routing_enums_pb2
+from ortools.constraint_solver import pywrapcp
+
+import data_prep
+import inference
+import routing
+import train_model
+import storage
+from spatial_index import SpatialIndex
+
+
+def make_synthetic_windows(num_bins, window=inference.HISTORY_LIMIT, seed=42):
+    """
+    Generate current bin states plus a columnar history window per bin.
+    Mixes normal hourly windows with the edge cases the heuristic handles:
+    empty / single-point windows, emptied bins and full bins.
+    """
+    rng = np.random.default_rng(seed)
+    bin_ids = np.array([f"bin_{i:06d}" for i in range(num_bins)])
+    now = time.time()
+
+    counts = rng.integers(0, window + 1, size=num_bins)
+    counts[rng.random(num_bins) < 0.8] = window
+
+    bin_col = np.repeat(bin_ids, counts)
+    offsets = np.concatenate([np.arange(c) for c in counts]) if len(counts) else []
+    ts = now - (np.repeat(counts, counts) - offsets) * 3600.0
+    base = np.repeat(rng.uniform(0, 60, num_bins), counts)
+    rate = np.repeat(rng.uniform(-2.0, 6.0, num_bins), counts)
+    fill = np.clip(base + rate * offsets, 0, 100).round(2)
+
+    history_df = pd.DataFrame({"bin_id": bin_col, "ts": ts, "fill": fill})
+    # Shuffle so the engine cannot rely on input order
+    history_df = history_df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+    current_fill = rng.uniform(0, 105, num_bins).clip(max=100).round(2)
+    bins_df = pd.DataFrame({"bin_id": bin_ids, "fill_level": current_fill})
+
+    return bins_df, history_df
+
+
+def bench_fill_rate(sizes=(100, 10_000, 100_000)):
+    """Compare the scalar and batched fill-rate / time-to-full paths"""
+    print("=== Fill Rate Engine Benchmark ===\n")
+    print(
+        f"{'bins':>8} {'scalar ms':>12} {'batch ms':>10} "
+        f"{'scalar us/bin':>14} {'batch us/bin':>13} {'speedup':>8} {'match':>6}"
+    )
+
+    for num_bins in sizes:
+        bins_df, history_df = make_synthetic_windows(num_bins)
+        current_time = time.time()
+
+        start = time.perf_counter()
+        scalar_df = inference.predict_time_to_full_scalar(
+            bins_df, history_df, current_time
+        )
+        scalar_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch_df = inference.predict_time_to_full_batch(
+            bins_df, history_df, current_time
+        )
+        batch_s = time.perf_counter() - start
+
+        match = all(
+            np.array_equal(scalar_df[col].to_numpy(), batch_df[col].to_numpy())
+            for col in ["fill_level", "fill_rate", "time_to_full_h"]
+        )
+
+        print(
+            f"{num_bins:>8} {scalar_s * 1000:>12.1f} {batch_s * 1000:>10.1f} "
+            f"{scalar_s / num_bins * 1e6:>14.2f} {batch_s / num_bins * 1e6:>13.2f} "
+            f"{scalar_s / batch_s:>7.1f}x {str(match):>6}"
+        )
+
+
+def populate_storage(store, num_bins, window=inference.HISTORY_LIMIT, seed=42):
+    """Fill a local storage backend with synthetic bins and history windows"""
+    bins_df, history_df = make_synthetic_windows(num_bins, window, seed)
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(33.2, 33.4, num_bins)
+    lon = rng.uniform(44.3, 44.5, num_bins)
+    now = int(time.time())
+
+    store.set_bins(
+        {
+            bin_id: {
+                "fill_level": fill,
+                "latitude": la,
+                "longitude": lo,
+                "timestamp": now,
+            }
+            for bin_id, fill, la, lo in zip(
+                bins_df["bin_id"], bins_df["fill_level"].tolist(), lat, lon
+            )
+        }
+    )
+    positions = pd.Index(bins_df["bin_id"]).get_indexer(history_df["bin_id"])
+    store.add_history_rows(
+        zip(
+            history_df["bin_id"],
+            history_df["ts"].astype(int).tolist(),
+            history_df["fill"].tolist(),
+            lat[positions].tolist(),
+            lon[positions].tolist(),
+        )
+    )
+
+
+def bench_pipeline(sizes=(1_000, 10_000, 100_000)):
+    """Time inference and routing preparation offline on in-memory storage"""
+    print("=== Offline Pipeline Benchmark (memory storage) ===\n")
+    rows = []
+
+    for num_bins in sizes:
+        store = storage.SQLiteStorage(":memory:")
+        populate_storage(store, num_bins)
+        storage.set_storage(store)
+
+        timings = {}
+        start = time.perf_counter()
+        inference.main()
+        timings["inference"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        predictions_df = routing.fetch_predictions()
+        selected = routing.select_bins_for_collection(predictions_df)
+        locations_df = routing.fetch_bin_locations(selected["bin_id"].tolist())
+        routing.create_distance_matrix(locations_df)
+        timings["routing_prep"] = time.perf_counter() - start
+
+        rows.append((num_bins, timings))
+
+    print(f"\n{'bins':>8} {'inference s':>12} {'routing prep s':>15}")
+    for num_bins, timings in rows:
+        print(
+            f"{num_bins:>8} {timings['inference']:>12.2f} "
+            f"{timings['routing_prep']:>15.2f}"
+        )
+
+
+def distance_matrix_loop(locations_df):
+    """Reference implementation: scalar haversine for every ordered pair"""
+    coords = [(routing.DEPOT_LAT, routing.DEPOT_LON)]
+    for _, row in locations_df.iterrows():
+        coords.append((row["latitude"], row["longitude"]))
+
+    n = len(coords)
+    distance_matrix = np.zeros((n, n))
+    for i in range(n):
+        for j in range(n):
+            if i != j:
+                lat1, lon1 = coords[i]
+                lat2, lon2 = coords[j]
+                distance_matrix[i][j] = (
+                    routing.haversine_distance(lat1, lon1, lat2, lon2) * 1000
+                )
+    return distance_matrix.astype(int)
+
+
+def bench_distance_matrix(sizes=(100, 500, 2_000), loop_max=2_000):
+    """Compare the nested-loop and vectorized tiled distance matrices"""
+    print("=== Distance Matrix Benchmark ===\n")
+    rng = np.random.default_rng(42)
+    rows = []
+
+    for num_bins in sizes:
+        locations_df = pd.DataFrame(
+            {
+                "bin_id": [f"bin_{i:06d}" for i in range(num_bins)],
+                "latitude": rng.uniform(33.2, 33.4, num_bins),
+                "longitude": rng.uniform(44.3, 44.5, num_bins),
+            }
+        )
+
+        start = time.perf_counter()
+        vectorized = routing.create_distance_matrix(locations_df)
+        vector_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        routing.create_distance_matrix(locations_df, dtype=np.int32)
+        int32_s = time.perf_counter() - start
+
+        loop_s, match = None, None
+        if num_bins <= loop_max:
+            start = time.perf_counter()
+            reference = distance_matrix_loop(locations_df)
+            loop_s = time.perf_counter() - start
+            match = np.array_equal(reference, vectorized)
+
+        rows.append((num_bins, loop_s, vector_s, int32_s, match))
+
+    print(
+        f"\n{'bins':>8} {'loop ms':>10} {'int64 ms':>10} {'int32 ms':>10} "
+        f"{'speedup':>9} {'match':>6}"
+    )
+    for num_bins, loop_s, vector_s, int32_s, match in rows:
+        loop_ms = f"{loop_s * 1000:.1f}" if loop_s is not None else "-"
+        speedup = f"{loop_s / vector_s:.0f}x" if loop_s is not None else "-"
+        print(
+            f"{num_bins:>8} {loop_ms:>10} {vector_s * 1000:>10.1f} "
+            f"{int32_s * 1000:>10.1f} {speedup:>9} {str(match):>6}"
+        )
+
+
+def solve_tsp_callback(distance_matrix, time_limit):
+    """Reference solver: Python distance callback and a fixed time limit"""
+    manager = pywrapcp.RoutingIndexManager(len(distance_matrix), 1, 0)
+    model = pywrapcp.RoutingModel(manager)
+
+    def distance_callback(from_index, to_index):
+        from_node = manager.IndexToNode(from_index)
+        to_node = manager.IndexToNode(to_index)
+        return distance_matrix[from_node][to_node]
+
+    model.SetArcCostEvaluatorOfAllVehicles(
+        model.RegisterTransitCallback(distance_callback)
+    )
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    )
+    search_parameters.local_search_metaheuristic = (
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    )
+    search_parameters.time_limit.seconds = time_limit
+    solution = model.SolveWithParameters(search_parameters)
+    return solution.ObjectiveValue()
+
+
+def bench_tsp(sizes=(30, 100), time_limit=10):
+    """Compare solution cost vs wall time: Python callback vs transit matrix"""
+    print("=== TSP Solver Benchmark ===\n")
+    rng = np.random.default_rng(42)
+    rows = []
+
+    for num_bins in sizes:
+        locations_df = pd.DataFrame(
+            {
+                "bin_id": [f"bin_{i:06d}" for i in range(num_bins)],
+                "latitude": rng.uniform(33.2, 33.4, num_bins),
+                "longitude": rng.uniform(44.3, 44.5, num_bins),
+            }
+        )
+        distance_matrix = routing.create_distance_matrix(locations_df)
+
+        start = time.perf_counter()
+        callback_cost = solve_tsp_callback(distance_matrix, time_limit)
+        callback_s = time.perf_counter() - start
+
+        progress = []
+        start = time.perf_counter()
+        _, matrix_cost = routing.solve_tsp(
+            distance_matrix, time_limit=time_limit, progress=progress
+        )
+        matrix_s = time.perf_counter() - start
+
+        # Previous route covering all but the last 10% of bins
+        bin_ids = locations_df["bin_id"].tolist()
+        previous = [
+            bin_ids[node - 1]
+            for node in routing.solve_tsp(distance_matrix, time_limit=time_limit)[0]
+            if node and node <= int(num_bins * 0.9)
+        ]
+        initial_route = routing.build_warm_start(previous, bin_ids, distance_matrix)
+        start = time.perf_counter()
+        _, warm_cost = routing.solve_tsp(
+            distance_matrix, initial_route, time_limit=time_limit
+        )
+        warm_s = time.perf_counter() - start
+
+        rows.append(
+            (
+                num_bins,
+                callback_cost,
+                callback_s,
+                matrix_cost,
+                matrix_s,
+                progress[-1][0],
+                warm_cost,
+                warm_s,
+            )
+        )
+
+    print(
+        f"\n{'bins':>6} {'callback km':>12} {'s':>6} {'matrix km':>10} {'s':>6} "
+        f"{'best at s':>10} {'warm km':>8} {'s':>6}"
+    )
+    for num_bins, cb_cost, cb_s, m_cost, m_s, best_s, w_cost, w_s in rows:
+        print(
+            f"{num_bins:>6} {cb_cost / 1000:>12.2f} {cb_s:>6.1f} "
+            f"{m_cost / 1000:>10.2f} {m_s:>6.1f} {best_s:>10.2f} "
+            f"{w_cost / 1000:>8.2f} {w_s:>6.1f}"
+        )
+
+
+def bench_clusters(num_bins=1_000, time_limit=1):
+    """Cluster-first routing wall time with one process vs every core"""
+    print("=== Cluster Routing Benchmark ===\n")
+    rng = np.random.default_rng(42)
+    locations_df = pd.DataFrame(
+        {
+            "bin_id": [f"bin_{i:06d}" for i in range(num_bins)],
+            "latitude": rng.uniform(33.2, 33.4, num_bins),
+            "longitude": rng.uniform(44.3, 44.5, num_bins),
+            "time_to_full_h": rng.uniform(0, 12, num_bins),
+            "fill_level": rng.uniform(50, 100, num_bins),
+        }
+    )
+    storage.set_storage(storage.SQLiteStorage(":memory:"))
+
+    rows = []
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            routes = routing.solve_clustered_routes(
+                locations_df, workers=workers, time_limit=time_limit
+            )
+        rows.append((workers, len(routes), time.perf_counter() - start))
+
+    print(f"{'bins':>8} {'workers':>8} {'routes':>7} {'wall s':>8} {'speedup':>8}")
+    for workers, num_routes, wall in rows:
+        print(
+            f"{num_bins:>8} {workers:>8} {num_routes:>7} {wall:>8.2f} "
+            f"{rows[0][2] / wall:>7.1f}x"
+        )
+
+
+def bench_spatial_index(sizes=(1_000, 10_000, 100_000), k=15, num_queries=1_000):
+    """
+    Spatial index and solver arc-cost (SparseDistances) build time and
+    memory vs a dense int64 distance matrix
+    """
+    print("=== Spatial Index Benchmark ===\n")
+    rng = np.random.default_rng(42)
+    rows = []
+
+    for num_bins in sizes:
+        locations_df = pd.DataFrame(
+            {
+                "bin_id": [f"bin_{i:06d}" for i in range(num_bins)],
+                "latitude": rng.uniform(33.2, 33.4, num_bins),
+                "longitude": rng.uniform(44.3, 44.5, num_bins),
+            }
+        )
+        query_lat = rng.uniform(33.2, 33.4, num_queries)
+        query_lon = rng.uniform(44.3, 44.5, num_queries)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = SpatialIndex(locations_df)
+        build_s = time.perf_counter() - start
+        index_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # The solver's sparse arc costs (kNN graph + depot and seed arcs)
+        tracemalloc.start()
+        start = time.perf_counter()
+        routing.SparseDistances(locations_df, k)
+        knn_s = time.perf_counter() - start
+        knn_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        index.nearest(query_lat, query_lon, k=1)
+        nearest_us = (time.perf_counter() - start) / num_queries * 1e6
+
+        start = time.perf_counter()
+        index.query_radius(query_lat, query_lon, 0.5)
+        radius_us = (time.perf_counter() - start) / num_queries * 1e6
+
+        dense_bytes = (num_bins + 1) ** 2 * 8
+        rows.append(
+            (
+                num_bins,
+                build_s,
+                index_bytes,
+                knn_s,
+                knn_bytes,
+                dense_bytes,
+                nearest_us,
+                radius_us,
+            )
+        )
+
+    print(
+        f"{'bins':>8} {'build ms':>9} {'index MB':>9} {'arcs ms':>8} {'arcs MB':>8} "
+        f"{'dense MB':>10} {'nearest us':>11} {'radius us':>10}"
+    )
+    for num_bins, build_s, index_b, knn_s, knn_b, dense_b, near_us, rad_us in rows:
+        print(
+            f"{num_bins:>8} {build_s * 1000:>9.1f} {index_b / 1e6:>9.2f} "
+            f"{knn_s * 1000:>8.1f} {knn_b / 1e6:>8.2f} {dense_b / 1e6:>10.1f} "
+            f"{near_us:>11.2f} {rad_us:>10.2f}"
+        )
+
+
+def make_synthetic_history(num_rows, readings_per_bin=720, seed=42):
+    """
+    Generate a cleaned /history frame (as data_prep.clean_data returns it):
+    hourly readings for num_rows / readings_per_bin bins that fill at a
+    per-bin rate, sit at 100% for a while and are then emptied.
+    """
+    rng = np.random.default_rng(seed)
+    num_bins = -(-num_rows // readings_per_bin)  # Last bin may be partial
+    bin_ids = np.array([f"bin_{i:06d}" for i in range(num_bins)], dtype=object)
+    offsets = np.arange(num_rows) % readings_per_bin
+
+    start = 1_700_000_000 + rng.integers(0, 3600, num_bins)
+    timestamps = np.repeat(start, readings_per_bin)[:num_rows] + offsets * 3600
+    rate = np.repeat(rng.uniform(0.5, 4.0, num_bins), readings_per_bin)[:num_rows]
+    base = np.repeat(rng.uniform(0, 100, num_bins), readings_per_bin)[:num_rows]
+    noise = rng.normal(0, 0.5, num_rows)
+    fill = np.clip((base + rate * offsets) % 120 + noise, 0, 100).round(2)
+
+    df = pd.DataFrame(
+        {
+            "bin_id": np.repeat(bin_ids, readings_per_bin)[:num_rows],
+            "timestamp": timestamps,
+            "fill_level": fill,
+            "latitude": 33.3,
+            "longitude": 44.4,
+        }
+    )
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="s")
+    return df
+
+
+def engineer_features_apply(df):
+    """Reference feature pipeline: one groupby-apply callback per bin and pass"""
+
+    def fill_rate(group):
+        group = group.sort_values("timestamp").copy()
+        group["time_diff_hours"] = group["timestamp"].diff() / 3600
+        group["fill_diff"] = group["fill_level"].diff()
+        group["fill_rate"] = np.where(
+            group["time_diff_hours"] > 0,
+            group["fill_diff"] / group["time_diff_hours"],
+            0,
+        )
+        group["fill_rate"] = group["fill_rate"].clip(lower=0)
+        group.loc[group.index[0], "fill_rate"] = 0
+        return group
+
+    def rolling(group, window=3):
+        group = group.sort_values("timestamp").copy()
+        rates = group["fill_rate"].rolling(window=window, min_periods=1)
+        group["fill_rate_rolling_mean"] = rates.mean()
+        group["fill_rate_rolling_std"] = rates.std().fillna(0)
+        return group
+
+    def time_to_full(group):
+        group = group.sort_values("timestamp").copy()
+        timestamps = group["timestamp"].to_numpy()
+        fill_level = group["fill_level"].to_numpy()
+        fill_rate = group["fill_rate"].to_numpy()
+        full_times = timestamps[fill_level >= 100]
+        next_full = np.searchsorted(full_times, timestamps, side="right")
+        has_full = next_full < len(full_times)
+        observed_hours = (
+            full_times[np.minimum(next_full, len(full_times) - 1)] - timestamps
+            if len(full_times)
+            else np.zeros(len(timestamps))
+        ) / 3600
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimated_hours = np.where(
+                fill_rate > 0, np.minimum((100 - fill_level) / fill_rate, 168), 168
+            )
+        group["time_to_full_hours"] = np.where(
+            fill_level >= 100, 0, np.where(has_full, observed_hours, estimated_hours)
+        )
+        return group
+
+    df = df.groupby("bin_id", group_keys=False).apply(fill_rate)
+    df = df.groupby("bin_id", group_keys=False).apply(rolling)
+    df = df.groupby("bin_id", group_keys=False).apply(lambda x: x.ffill().bfill())
+    df = df.fillna(0)
+    df = data_prep.compute_time_features(df)
+    df = df.groupby("bin_id", group_keys=False).apply(time_to_full)
+    return df[df["time_to_full_hours"] > 0]
+
+
+def profile_call(fn, *args):
+    """(result, seconds, peak traced bytes) of fn(*args), prints silenced"""
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        fn(*args)
+        seconds = time.perf_counter() - start
+
+        # Second run under tracemalloc, which would distort the timing
+        tracemalloc.start()
+        result = fn(*args)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak_bytes
+
+
+def bench_features(sizes=(100_000, 1_000_000, 10_000_000), reference_max=1_000_000):
+    """Feature engineering time and peak memory: per-bin apply vs one pass"""
+    print("=== Feature Engineering Benchmark ===\n")
+    rows = []
+
+    for num_rows in sizes:
+        history_df = make_synthetic_history(num_rows)
+        input_mb = history_df.memory_usage(deep=True).sum() / 1e6
+
+        features, fast_s, fast_b = profile_call(
+            data_prep.engineer_features, history_df
+        )
+
+        apply_s = apply_b = match = None
+        if num_rows <= reference_max:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", FutureWarning)
+                reference, apply_s, apply_b = profile_call(
+                    engineer_features_apply, history_df
+                )
+            reference = reference.reset_index(drop=True)
+            features = features.reset_index(drop=True)
+            match = list(reference.columns) == list(features.columns) and all(
+                np.allclose(reference[col], features[col], rtol=1e-9, atol=1e-6)
+                for col in features.columns
+                if features[col].dtype.kind in "fi"
+            )
+        del features
+
+        rows.append((num_rows, input_mb, apply_s, apply_b, fast_s, fast_b, match))
+
+    print(
+        f"{'rows':>10} {'input MB':>9} {'apply s':>8} {'apply peak MB':>14} "
+        f"{'single-pass s':>14} {'peak MB':>8} {'speedup':>8} {'match':>6}"
+    )
+    for num_rows, input_mb, apply_s, apply_b, fast_s, fast_b, match in rows:
+        reference_run = apply_s is not None
+        print(
+            f"{num_rows:>10} {input_mb:>9.0f} "
+            f"{f'{apply_s:.2f}' if reference_run else '-':>8} "
+            f"{f'{apply_b / 1e6:.0f}' if reference_run else '-':>14} "
+            f"{fast_s:>14.2f} {fast_b / 1e6:>8.0f} "
+            f"{f'{apply_s / fast_s:.1f}x' if reference_run else '-':>8} "
+            f"{str(match):>6}"
+        )
+
+
+def directory_size(path):
+    """Total size in bytes of the files under path"""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def bench_dataset(sizes=(100_000, 1_000_000, 5_000_000)):
+    """Prepared dataset as CSV vs typed .npy columns: size, load time, peak RAM"""
+    print("=== Training Dataset Format Benchmark ===\n")
+    rows = []
+
+    for num_rows in sizes:
+        with redirect_stdout(io.StringIO()):
+            features = data_prep.engineer_features(make_synthetic_history(num_rows))
+        workdir = tempfile.mkdtemp(prefix="dataset_bench_")
+        try:
+            csv_path = os.path.join(workdir, "prepared_data.csv")
+            features.to_csv(csv_path, index=False)
+            partition_dir = os.path.join(workdir, "prepared")
+            os.makedirs(partition_dir)
+            data_prep.write_partition(
+                features, os.path.join(partition_dir, "part-00000")
+            )
+            del features
+
+            def load_csv():
+                # Previous loader: parse every column, then select
+                return train_model.prepare_features(pd.read_csv(csv_path))
+
+            def load_columns():
+                return train_model.prepare_features(
+                    train_model.load_data(partition_dir)
+                )
+
+            _, csv_s, csv_b = profile_call(load_csv)
+            _, npy_s, npy_b = profile_call(load_columns)
+            rows.append(
+                (
+                    num_rows,
+                    os.path.getsize(csv_path),
+                    directory_size(partition_dir),
+                    csv_s,
+                    npy_s,
+                    csv_b,
+                    npy_b,
+                )
+            )
+        finally:
+            shutil.rmtree(workdir)
+
+    print(
+        f"{'rows':>10} {'csv MB':>8} {'npy MB':>8} {'csv load s':>11} "
+        f"{'npy load s':>11} {'csv peak MB':>12} {'npy peak MB':>12}"
+    )
+    for num_rows, csv_b, npy_b, csv_s, npy_s, csv_peak, npy_peak in rows:
+        print(
+            f"{num_rows:>10} {csv_b / 1e6:>8.1f} {npy_b / 1e6:>8.1f} "
+            f"{csv_s:>11.2f} {npy_s:>11.3f} {csv_peak / 1e6:>12.0f} "
+            f"{npy_peak / 1e6:>12.0f}"
+        )
+
+
+BENCHMARKS = {
+    "fill-rate": bench_fill_rate,
+    "pipeline": bench_pipeline,
+    "distance-matrix": bench_distance_matrix,
+    "tsp": bench_tsp,
+    "clusters": bench_clusters,
+    "spatial-index": bench_spatial_index,
+    "features": bench_features,
+    "dataset": bench_dataset,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Dashboard Summaries
+Small precomputed views of fleet state for the dashboard, so browsers
+fetch a few kilobytes instead of subscribing to the whole /bins,
+/predictions and /history trees:
+
+- status_counts: bins per fill band (same thresholds as the dashboard)
+- urgent: the bins closest to full (by predicted time-to-full, then fill)
+- areas: per-area bin count, average fill and average time-to-full, where
+  an area is an AREA_CELL_DEG grid cell of the bins' coordinates
+- trend: the most urgent bin's last TREND_POINTS readings (fill chart)
+- predictions: per-bin forecasts, soonest full first (bounded table)
+
+The summary is rebuilt only when fleet state changes (the fleet cache's
+version) or, without a running cache, at most every SUMMARY_TTL_SECONDS.
+Each summary carries an ETag so unchanged polls can be answered with 304.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from fleet_cache import get_fleet_cache, get_reader
+
+# Configuration
+CRITICAL_FILL = 90  # Fill level (%) at or above which a bin is Critical
+WARNING_FILL = 70  # Fill level (%) at or above which a bin is Warning
+TOP_URGENT = 10  # Urgent bins included in the summary
+MAX_URGENT = 100  # Longest urgent list served by /dashboard/urgent
+TREND_POINTS = 10  # Readings in the fill-trend chart
+AREA_CELL_DEG = 0.05  # Area grid cell size in degrees (about 5 km)
+MAX_AREAS = 50  # Areas served, soonest average time-to-full first
+DEFAULT_PREDICTIONS = 100  # Rows served by /dashboard/predictions
+MAX_PREDICTIONS = 500  # Longest prediction table kept and served
+SUMMARY_TTL_SECONDS = 5.0  # Rebuild interval when no fleet cache is running
+
+STATUS_BANDS = ["Critical", "Warning", "Normal"]
+
+
+def fleet_frame(bins, predictions):
+    """One row per bin: current state joined with its prediction"""
+    rows = [
+        (
+            bin_id,
+            state.get("fill_level"),
+            state.get("latitude"),
+            state.get("longitude"),
+            state.get("timestamp"),
+        )
+        for bin_id, state in bins.items()
+        if isinstance(state, dict)
+    ]
+    df = pd.DataFrame(
+        rows, columns=["bin_id", "fill_level", "latitude", "longitude", "timestamp"]
+    )
+    for column in ["fill_level", "latitude", "longitude", "timestamp"]:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    df["fill_level"] = df["fill_level"].fillna(0)
+
+    predictions = {
+        bin_id: pred for bin_id, pred in predictions.items() if isinstance(pred, dict)
+    }
+    for column in ["time_to_full_h", "fill_rate", "predicted_at"]:
+        values = {bin_id: pred.get(column) for bin_id, pred in predictions.items()}
+        df[column] = pd.to_numeric(df["bin_id"].map(values), errors="coerce")
+    df["status"] = np.select(
+        [df["fill_level"] >= CRITICAL_FILL, df["fill_level"] >= WARNING_FILL],
+        STATUS_BANDS[:2],
+        default=STATUS_BANDS[2],
+    )
+    return df
+
+
+def records(df):
+    """JSON-safe row dicts (NaN becomes None)"""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def area_cells(latitude, longitude, cell_deg=AREA_CELL_DEG):
+    """Grid-cell label ("lat,lon" of the cell's south-west corner) per bin"""
+    # The epsilon keeps bins on a cell edge out of the cell below
+    lat_cell = np.floor(latitude / cell_deg + 1e-9) * cell_deg
+    lon_cell = np.floor(longitude / cell_deg + 1e-9) * cell_deg
+    labels = lat_cell.map("{:.2f}".format) + "," + lon_cell.map("{:.2f}".format)
+    return labels.where(latitude.notna() & longitude.notna())
+
+
+def build_areas(df, cell_deg=AREA_CELL_DEG, max_areas=MAX_AREAS):
+    """Per-area averages over the bins with coordinates"""
+    areas = (
+        df.assign(area=area_cells(df["latitude"], df["longitude"], cell_deg))
+        .groupby("area", sort=True)
+        .agg(
+            bins=("bin_id", "size"),
+            latitude=("latitude", "mean"),
+            longitude=("longitude", "mean"),
+            average_fill=("fill_level", "mean"),
+            critical=("status", lambda s: int((s == "Critical").sum())),
+            average_time_to_full_h=("time_to_full_h", "mean"),
+        )
+        .reset_index()
+        .sort_values(
+            ["average_time_to_full_h", "average_fill"],
+            ascending=[True, False],
+            na_position="last",
+        )
+        .head(max_areas)
+    )
+    areas = areas.round(
+        {"latitude": 5, "longitude": 5, "average_fill": 2, "average_time_to_full_h": 2}
+    )
+    return records(areas)
+
+
+def build_summary(df, max_urgent=MAX_URGENT):
+    """Aggregate the fleet frame into the dashboard summary"""
+    status_counts = df["status"].value_counts()
+    # Predicted soonest-full first; bins without a prediction by fill level
+    urgent = df.sort_values(
+        ["time_to_full_h", "fill_level"], ascending=[True, False], na_position="last"
+    ).head(max_urgent)
+
+    return {
+        "bins": len(df),
+        "predictions": int(df["time_to_full_h"].notna().sum()),
+        "average_fill": round(float(df["fill_level"].mean()), 2) if len(df) else 0,
+        "status_counts": {
+            band: int(status_counts.get(band, 0)) for band in STATUS_BANDS
+        },
+        "urgent": records(
+            urgent[
+                [
+                    "bin_id",
+                    "fill_level",
+                    "status",
+                    "time_to_full_h",
+                    "latitude",
+                    "longitude",
+                    "timestamp",
+                ]
+            ]
+        ),
+        "areas": build_areas(df),
+    }
+
+
+def build_trend(reader, bin_id, limit=TREND_POINTS):
+    """One bin's last readings for the fill-trend chart (empty without a bin)"""
+    if bin_id is None:
+        return {"bin_id": None, "readings": []}
+    history = reader.get_histories([bin_id], limit)
+    readings = [
+        {"timestamp": ts, "fill_level": fill}
+        for ts, fill in zip(history["ts"].tolist(), history["fill"].tolist())
+    ]
+    return {"bin_id": bin_id, "readings": readings}
+
+
+def build_prediction_table(df, max_rows=MAX_PREDICTIONS):
+    """Bins with a prediction, soonest full first"""
+    table = df[df["time_to_full_h"].notna()].sort_values(
+        ["time_to_full_h", "fill_level"], ascending=[True, False]
+    )
+    return records(
+        table.head(max_rows)[
+            [
+                "bin_id",
+                "fill_level",
+                "status",
+                "fill_rate",
+                "time_to_full_h",
+                "predicted_at",
+            ]
+        ]
+    )
+
+
+def compute_etag(payload):
+    """Stable content hash of a JSON payload"""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(body.encode()).hexdigest()[:20]
+
+
+class DashboardSummary:
+    """
+    Precomputed summary and prediction table, rebuilt only when fleet state
+    may have changed
+    """
+
+    def __init__(self, ttl=SUMMARY_TTL_SECONDS):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.state_key = None
+        self.summary = None
+        self.table = None
+        self.etag = None
+
+    def _state_key(self):
+        cache = get_fleet_cache()
+        if cache is not None and cache.ready.is_set():
+            return ("cache", cache.version)
+        return ("ttl", int(time.time() // self.ttl))
+
+    def _refresh(self):
+        """Rebuild if needed (lock held)"""
+        # Read the key before the data so a concurrent change forces a rebuild
+        state_key = self._state_key()
+        if state_key == self.state_key:
+            return
+        reader = get_reader()
+        df = fleet_frame(reader.get_bins(), reader.get_predictions())
+        summary = build_summary(df)
+        urgent = summary["urgent"]
+        summary["trend"] = build_trend(reader, urgent[0]["bin_id"] if urgent else None)
+        table = build_prediction_table(df)
+        etag = compute_etag([summary, table])
+        if etag != self.etag:
+            summary["generated_at"] = time.time()
+            self.summary, self.table, self.etag = summary, table, etag
+        self.state_key = state_key
+
+    def get(self):
+        """(summary, etag); the lock keeps concurrent polls to one rebuild"""
+        with self.lock:
+            self._refresh()
+            return self.summary, self.etag
+
+    def overview(self, top_n=TOP_URGENT):
+        """Summary with the urgent list cut to top_n"""
+        summary, etag = self.get()
+        top_n = max(0, min(top_n, MAX_URGENT))
+        return {**summary, "urgent": summary["urgent"][:top_n]}, f"{etag}-{top_n}"
+
+    def urgent(self, limit=TOP_URGENT):
+        """Just the limit most urgent bins"""
+        summary, etag = self.get()
+        limit = max(0, min(limit, MAX_URGENT))
+        payload = {
+            "urgent": summary["urgent"][:limit],
+            "generated_at": summary["generated_at"],
+        }
+        return payload, f"{etag}-u{limit}"
+
+    def predictions(self, limit=DEFAULT_PREDICTIONS):
+        """The limit soonest-full predicted bins"""
+        with self.lock:
+            self._refresh()
+            summary, table, etag = self.summary, self.table, self.etag
+        limit = max(0, min(limit, MAX_PREDICTIONS))
+        payload = {
+            "predictions": table[:limit],
+            "total": summary["predictions"],
+            "generated_at": summary["generated_at"],
+        }
+        return payload, f"{etag}-p{limit}"
+
+
+_summary = DashboardSummary()
+
+
+def get_dashboard_summary():
+    """Return the process-wide dashboard summary"""
+    return _summary
@@ -2,55 +2,146 @@
 Data Preparation and Feature Engineering Script
 Reads historical bin data from Firebase, cleans it, computes features,
 and prepares it for training.
+
+Runs are incremental: the output directory holds append-only partitions
+(part-*/, one typed .npy file per column) plus per-bin state (last processed timestamp and the rows
+still needed as context, context-*/ in the same format), so each run fetches and featurizes only readings
+newer than the last one. Pass --full to rebuild from all of /history.
+
+Usage:
+  python data_prep.py [--full]
 """
 
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, db
+import glob
 import json
 import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import get_storage
+
+# Configuration
+PREPARED_DATA_DIR = "data/prepared"  # Partitions and incremental state
+ROLLING_WINDOW = 3  # Readings per rolling fill-rate window
+MAX_PARTITIONS = 48  # Partitions kept before they are compacted into one
+STATE_FILE = "_state.json"
+
+# Ingestion: bins are listed with their last-write marker, then only bins
+# with readings past their watermark are read, in key-range pages
+HISTORY_PAGE_SIZE = 5000  # Readings per request
+INGEST_BATCH_BINS = 200  # Bins fetched, featurized and written per batch
+INGEST_WORKERS = int(os.environ.get("DATA_PREP_WORKERS", 8))  # Parallel bin reads
+COPY_CHUNK_ROWS = 1_000_000  # Rows per chunk when finalizing/compacting partitions
+
+RAW_COLUMNS = ["bin_id", "timestamp", "fill_level", "latitude", "longitude"]
+
+# Partition column types; bin_id is stored as int32 codes into the
+# partition's bin list and datetime is derived from timestamp on load
+COLUMN_DTYPES = {
+    "timestamp": np.int32,
+    "fill_level": np.float32,
+    "latitude": np.float32,
+    "longitude": np.float32,
+    "time_diff_hours": np.float32,
+    "fill_diff": np.float32,
+    "fill_rate": np.float32,
+    "fill_rate_rolling_mean": np.float32,
+    "fill_rate_rolling_std": np.float32,
+    "hour": np.int8,
+    "weekday": np.int8,
+    "is_weekend": np.int8,
+    "time_to_full_hours": np.float32,
+}
+
+# Context column types; fill_level stays float64 so recomputed fill rates
+# match a full rebuild
+CONTEXT_DTYPES = {
+    "timestamp": np.int32,
+    "fill_level": np.float64,
+    "latitude": np.float32,
+    "longitude": np.float32,
+}
+
+
+# --- Ingestion ---
+def page_to_columns(bin_id, page):
+    """Typed column chunk (RAW_COLUMNS) from one page of {timestamp: reading}"""
+    readings = list(page.values())
+
+    def numeric(field, default=0):
+        # Bad sensor values (e.g. "error") become NaN, as in clean_data
+        values = [reading.get(field, default) for reading in readings]
+        values = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+        return values.to_numpy(np.float64)
+
+    return {
+        "bin_id": np.full(len(page), bin_id, dtype=object),
+        "timestamp": np.fromiter(map(int, page), dtype=np.int64, count=len(page)),
+        "fill_level": numeric("fill_level"),
+        "latitude": numeric("latitude"),
+        "longitude": numeric("longitude"),
+    }
+
+
+def columns_to_frame(chunks):
+    """Concatenate typed column chunks into one raw frame"""
+    if not chunks:
+        return pd.DataFrame(columns=RAW_COLUMNS)
+    return pd.DataFrame(
+        {
+            column: np.concatenate([chunk[column] for chunk in chunks])
+            for column in RAW_COLUMNS
+        }
+    )
 
 
-# Initialize Firebase
-def init_firebase():
-    """Initialize Firebase Admin SDK"""
-    if not firebase_admin._apps:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(
-            cred,
-            {
-                "databaseURL": "https://smart-waste-3d7d0-default-rtdb.europe-west1.firebasedatabase.app/"
-            },
-        )
-
-
-def fetch_historical_data():
-    """Fetch all historical data from Firebase /history"""
-    print("Fetching historical data from Firebase...")
-    ref = db.reference("/history")
-    history_data = ref.get()
-
-    if not history_data:
-        raise ValueError("No historical data found in Firebase")
+def iter_bin_pages(storage, bin_id, after=None, page_size=HISTORY_PAGE_SIZE):
+    """Yield one bin's readings after `after` as column chunks, a key range at a time"""
+    while True:
+        page = storage.get_history_since(bin_id, after, limit=page_size)
+        if not page:
+            return
+        yield page_to_columns(bin_id, page)
+        if len(page) < page_size:
+            return
+        after = max(int(timestamp) for timestamp in page)
+
+
+def iter_history_batches(
+    watermarks,
+    batch_bins=INGEST_BATCH_BINS,
+    workers=INGEST_WORKERS,
+    page_size=HISTORY_PAGE_SIZE,
+):
+    """
+    Yield (bin_ids, raw frame) per batch of batch_bins bins, holding each
+    bin's readings after watermarks[bin_id] (all of them for unknown bins).
+    Bins whose last-write marker has not moved past their watermark are
+    skipped without a request; the rest are paged through in parallel, so
+    memory is bounded by one batch, not by the history size.
+    """
+    storage = get_storage()
+    heads = storage.get_history_heads()
+    bin_ids = sorted(
+        bin_id
+        for bin_id, head in heads.items()
+        if head is None or bin_id not in watermarks or head > watermarks[bin_id]
+    )
+    print(f"{len(bin_ids)}/{len(heads)} bins have readings past their watermark")
 
-    # Convert nested Firebase data to list of records
-    records = []
-    for bin_id, timestamps in history_data.items():
-        if timestamps:
-            for timestamp, data in timestamps.items():
-                record = {
-                    "bin_id": bin_id,
-                    "timestamp": int(timestamp),
-                    "fill_level": data.get("fill_level", 0),
-                    "latitude": data.get("latitude", 0),
-                    "longitude": data.get("longitude", 0),
-                }
-                records.append(record)
+    def fetch_bin(bin_id):
+        return list(iter_bin_pages(storage, bin_id, watermarks.get(bin_id), page_size))
 
-    print(f"Fetched {len(records)} historical records")
-    return pd.DataFrame(records)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for i in range(0, len(bin_ids), batch_bins):
+            batch = bin_ids[i : i + batch_bins]
+            pages = executor.map(fetch_bin, batch)
+            chunks = [chunk for bin_pages in pages for chunk in bin_pages]
+            yield batch, columns_to_frame(chunks)
 
 
 def clean_data(df):
@@ -85,45 +176,78 @@ def clean_data(df):
     return df
 
 
-def compute_fill_rate(group):
-    """Compute fill rate (percentage change per hour) for a bin's time series"""
-    group = group.sort_values("timestamp").copy()
+def bin_segments(bin_ids):
+    """
+    For rows sorted by bin_id: each row's bin number (0, 1, ...) and its
+    position within that bin's run of rows.
+    """
+    bin_ids = np.asarray(bin_ids)
+    starts = np.ones(len(bin_ids), dtype=bool)
+    starts[1:] = bin_ids[1:] != bin_ids[:-1]
+    segment = np.cumsum(starts) - 1
+    position = np.arange(len(bin_ids)) - np.flatnonzero(starts)[segment]
+    return segment, position
+
+
+def grouped_diff(values, position):
+    """Difference to the previous row of the same bin (NaN for a bin's first row)"""
+    diff = np.full(len(values), np.nan)
+    diff[1:] = values[1:] - values[:-1]
+    diff[position == 0] = np.nan
+    return diff
 
+
+def compute_fill_rate(df, position):
+    """Compute fill rate (percentage change per hour) for every bin's time series"""
     # Calculate time differences in hours
-    group["time_diff_hours"] = group["timestamp"].diff() / 3600
+    timestamps = df["timestamp"].to_numpy(np.float64)
+    df["time_diff_hours"] = grouped_diff(timestamps, position) / 3600
 
     # Calculate fill level differences
-    group["fill_diff"] = group["fill_level"].diff()
+    df["fill_diff"] = grouped_diff(df["fill_level"].to_numpy(np.float64), position)
 
-    # Calculate fill rate (percentage per hour)
-    group["fill_rate"] = np.where(
-        group["time_diff_hours"] > 0, group["fill_diff"] / group["time_diff_hours"], 0
-    )
+    # Calculate fill rate (percentage per hour); a bin's first row has no
+    # previous data and gets 0
+    time_diff = df["time_diff_hours"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fill_rate = np.where(time_diff > 0, df["fill_diff"].to_numpy() / time_diff, 0)
 
     # Handle negative fill rates (bin was emptied) - set to 0
-    group["fill_rate"] = group["fill_rate"].clip(lower=0)
+    df["fill_rate"] = np.clip(fill_rate, 0, None)
+    return df
 
-    # First row has no previous data
-    group.loc[group.index[0], "fill_rate"] = 0
 
-    return group
+def compute_rolling_features(df, position, window=ROLLING_WINDOW):
+    """Compute rolling statistics for fill rate over each bin's last `window` rows"""
+    values = df["fill_rate"].to_numpy()
+    # Windows are summed lag by lag, masking lags that cross into the previous bin
+    lags = [(lag, position[lag:] >= lag) for lag in range(1, window)]
 
+    total = values.copy()
+    count = np.ones(len(values))
+    for lag, valid in lags:
+        total[lag:] += np.where(valid, values[:-lag], 0)
+        count[lag:] += valid
+    mean = total / count
 
-def compute_rolling_features(group, window=3):
-    """Compute rolling statistics for fill rate"""
-    group = group.sort_values("timestamp").copy()
+    squares = (values - mean) ** 2
+    for lag, valid in lags:
+        squares[lag:] += np.where(valid, (values[:-lag] - mean[lag:]) ** 2, 0)
 
-    # Rolling mean of fill rate
-    group["fill_rate_rolling_mean"] = (
-        group["fill_rate"].rolling(window=window, min_periods=1).mean()
-    )
+    # Rolling mean and (sample) std of fill rate; a single reading has std 0
+    df["fill_rate_rolling_mean"] = mean
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["fill_rate_rolling_std"] = np.nan_to_num(np.sqrt(squares / (count - 1)))
+    return df
 
-    # Rolling std of fill rate
-    group["fill_rate_rolling_std"] = (
-        group["fill_rate"].rolling(window=window, min_periods=1).std().fillna(0)
-    )
 
-    return group
+def fill_missing(df, segment):
+    """Fill gaps from neighbouring rows of the same bin (forward, then backward)"""
+    columns = df.columns[df.isna().any()]
+    if len(columns):
+        grouped = df[columns].groupby(segment)
+        df[columns] = grouped.ffill().groupby(segment).bfill()
+    return df.fillna(0)  # Final safety net (bins with no value at all)
 
 
 def compute_time_features(df):
@@ -134,60 +258,62 @@ def compute_time_features(df):
     return df
 
 
-def compute_time_to_full(group):
-    """Compute time to full (hours) for each record."""
-    group = group.sort_values("timestamp").copy()
-    time_to_full = []
-
-    for idx, row in group.iterrows():
-        current_time = row["timestamp"]
-        current_fill = row["fill_level"]
+def compute_time_to_full(df, segment):
+    """
+    Compute time to full (hours) for each record: the time until the bin's
+    next reading at 100%, else an estimate from the fill rate (capped at
+    168h). The next full reading is found with one reverse scan.
+    """
+    timestamps = df["timestamp"].to_numpy()
+    fill_level = df["fill_level"].to_numpy()
+    fill_rate = df["fill_rate"].to_numpy()
+    n = len(df)
+
+    # Index of the next full reading strictly after each row (n if none)
+    full_at = np.where(fill_level >= 100, np.arange(n), n)
+    next_full = np.empty(n, dtype=np.int64)
+    next_full[:-1] = np.minimum.accumulate(full_at[::-1])[::-1][1:]
+    next_full[-1:] = n
+    has_full = next_full < n
+    # ... within the same bin
+    has_full[has_full] = segment[next_full[has_full]] == segment[has_full]
+    observed_hours = (timestamps[np.where(has_full, next_full, 0)] - timestamps) / 3600
+
+    # Estimate based on fill rate if no full record follows
+    with np.errstate(divide="ignore", invalid="ignore"):
+        estimated_hours = np.where(
+            fill_rate > 0, np.minimum((100 - fill_level) / fill_rate, 168), 168
+        )
 
-        if current_fill >= 100:
-            time_to_full.append(0)
-        else:
-            # Look forward to find when it becomes full
-            future_data = group[group["timestamp"] > current_time]
-            full_records = future_data[future_data["fill_level"] >= 100]
-
-            if len(full_records) > 0:
-                time_to_full_seconds = full_records.iloc[0]["timestamp"] - current_time
-                time_to_full_hours = time_to_full_seconds / 3600
-                time_to_full.append(time_to_full_hours)
-            else:
-                # Estimate based on fill rate if no full record found
-                if row["fill_rate"] > 0:
-                    remaining_capacity = 100 - current_fill
-                    estimated_hours = remaining_capacity / row["fill_rate"]
-                    time_to_full.append(min(estimated_hours, 168))
-                else:
-                    time_to_full.append(168)
-
-    group["time_to_full_hours"] = time_to_full
-    return group
+    df["time_to_full_hours"] = np.where(
+        fill_level >= 100, 0, np.where(has_full, observed_hours, estimated_hours)
+    )
+    return df
 
 
 def engineer_features(df):
-    """Complete feature engineering pipeline"""
+    """
+    Complete feature engineering pipeline. Rows are sorted by bin and time
+    once; every per-bin feature is then a vectorized pass over the whole
+    frame rather than a callback per bin.
+    """
     print("Engineering features...")
 
-    # Compute fill rate per bin
-    df = df.groupby("bin_id", group_keys=False).apply(compute_fill_rate)
+    df = df.sort_values(["bin_id", "timestamp"]).reset_index(drop=True)
+    segment, position = bin_segments(df["bin_id"].to_numpy())
 
-    # Compute rolling statistics per bin
-    df = df.groupby("bin_id", group_keys=False).apply(compute_rolling_features)
+    # Compute fill rate and its rolling statistics per bin
+    df = compute_fill_rate(df, position)
+    df = compute_rolling_features(df, position)
 
-    # FIX: Handle NaN values created by rolling windows (first few rows)
-    # Fill forward then backward to ensure no gaps
-    df = df.groupby("bin_id", group_keys=False).apply(lambda x: x.ffill().bfill())
-    df = df.fillna(0)  # Final safety net
+    # Handle NaN values (e.g. each bin's first diff)
+    df = fill_missing(df, segment)
 
     # Add time-based features
     df = compute_time_features(df)
 
     # Compute target variable (time to full)
-    print("Computing time to full (this may take a moment)...")
-    df = df.groupby("bin_id", group_keys=False).apply(compute_time_to_full)
+    df = compute_time_to_full(df, segment)
 
     # Remove rows with invalid targets
     df = df[df["time_to_full_hours"] > 0]
@@ -196,12 +322,418 @@ def engineer_features(df):
     return df
 
 
-def save_prepared_data(df, output_path="data/prepared_data.csv"):
-    """Save the prepared dataset"""
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_csv(output_path, index=False)
-    print(f"Prepared data saved to {output_path}")
+# --- Partitioned output ---
+def run_number(path):
+    """Run that wrote a part-NNNNN or context-NNNNN directory"""
+    return int(os.path.basename(path).rsplit("-", 1)[1])
+
+
+def partition_paths(output_dir=PREPARED_DATA_DIR):
+    """
+    Committed partition directories in write order. A partition numbered
+    at or above the state's run count belongs to a run that never committed.
+    """
+    state = load_state(output_dir)
+    runs = state["runs"] if state else 0
+    paths = sorted(glob.glob(os.path.join(output_dir, "part-*[0-9]")))
+    return [path for path in paths if run_number(path) < runs]
+
+
+class PartitionWriter:
+    """
+    Builds a partition from DataFrame batches. Columns are appended to raw
+    files as batches arrive and turned into .npy files on close(), so only
+    one batch is ever in memory. The directory appears only when complete.
+    """
+
+    def __init__(self, path, dtypes=COLUMN_DTYPES):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.rows = 0
+        self.bin_codes = {}  # bin_id -> int32 code, in first-seen order
+        self.column_dtypes = dtypes
+        self.dtypes = {"bin_id": np.int32, **dtypes}
+        self.files = {
+            column: open(os.path.join(self.tmp_path, f"{column}.raw"), "wb")
+            for column in self.dtypes
+        }
+
+    def append(self, df):
+        local_codes, uniques = pd.factorize(df["bin_id"])
+        codes = np.array(
+            [self.bin_codes.setdefault(b, len(self.bin_codes)) for b in uniques],
+            dtype=np.int32,
+        )
+        codes[local_codes].tofile(self.files["bin_id"])
+        for column, dtype in self.column_dtypes.items():
+            df[column].to_numpy(dtype).tofile(self.files[column])
+        self.rows += len(df)
+
+    def close(self):
+        for column, dtype in self.dtypes.items():
+            self.files[column].close()
+            raw_path = os.path.join(self.tmp_path, f"{column}.raw")
+            out = np.lib.format.open_memmap(
+                os.path.join(self.tmp_path, f"{column}.npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(self.rows,),
+            )
+            if self.rows:
+                raw = np.memmap(raw_path, dtype=dtype, mode="r", shape=(self.rows,))
+                for i in range(0, self.rows, COPY_CHUNK_ROWS):
+                    out[i : i + COPY_CHUNK_ROWS] = raw[i : i + COPY_CHUNK_ROWS]
+                del raw
+            out.flush()
+            del out
+            os.remove(raw_path)
+
+        with open(os.path.join(self.tmp_path, "meta.json"), "w") as f:
+            json.dump({"rows": self.rows, "bin_ids": list(self.bin_codes)}, f)
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+def write_partition(df, path, dtypes=COLUMN_DTYPES):
+    """Write df as one typed .npy file per column"""
+    writer = PartitionWriter(path, dtypes)
+    writer.append(df)
+    writer.close()
+
+
+def partition_index(paths, mmap_mode="r"):
+    """
+    Dedupe partitions on (bin, timestamp). Later partitions hold recomputed
+    rows (e.g. relabelled targets), so for duplicate readings the last wins.
+    Returns (bin_ids, keys, rows, offsets): the shared sorted bin list, each
+    surviving row's key (bin position << 32 | timestamp) in bin/time order,
+    its global row number and each partition's first global row.
+    """
+    part_bins = []
+    for path in paths:
+        with open(os.path.join(path, "meta.json")) as f:
+            part_bins.append(json.load(f)["bin_ids"])
+    bin_ids = pd.Index(sorted({b for names in part_bins for b in names}))
+
+    keys = []
+    for names, path in zip(part_bins, paths):
+        codes = np.load(os.path.join(path, "bin_id.npy"), mmap_mode=mmap_mode)
+        timestamps = np.load(os.path.join(path, "timestamp.npy"), mmap_mode=mmap_mode)
+        positions = bin_ids.get_indexer(names)[codes].astype(np.int64)
+        keys.append(positions << 32 | timestamps.astype(np.int64))
+    offsets = np.cumsum([0] + [len(part_keys) for part_keys in keys])
+    keys = np.concatenate(keys)
+
+    # np.unique on the reversed keys finds each key's last occurrence
+    unique_keys, reversed_index = np.unique(keys[::-1], return_index=True)
+    rows = len(keys) - 1 - reversed_index
+    return bin_ids, unique_keys, rows, offsets
+
+
+def gather_column(paths, column, rows, offsets, mmap_mode="r"):
+    """Values of one column at global row numbers, read partition by partition"""
+    parts = [
+        np.load(os.path.join(path, f"{column}.npy"), mmap_mode=mmap_mode)
+        for path in paths
+    ]
+    if len(parts) == 1 and np.array_equal(rows, np.arange(len(parts[0]))):
+        return parts[0]  # Already deduplicated and in order: no copy
+
+    values = np.empty(len(rows), dtype=parts[0].dtype)
+    part_of_row = np.searchsorted(offsets, rows, side="right") - 1
+    for part_number in np.unique(part_of_row):
+        selected = part_of_row == part_number
+        values[selected] = parts[part_number][rows[selected] - offsets[part_number]]
+    return values
+
+
+def load_prepared_columns(columns=None, output_dir=PREPARED_DATA_DIR, mmap_mode="r"):
+    """
+    Read columns (default: all) from every partition as {column: array},
+    deduplicated and ordered by bin and time (see partition_index). bin_id
+    comes back as a pd.Categorical. A single duplicate-free partition (e.g.
+    after compaction) is returned as memory-mapped arrays, uncopied.
+    """
+    paths = partition_paths(output_dir)
+    if not paths:
+        raise FileNotFoundError(f"No prepared data in {output_dir}")
+    columns = list(columns or ["bin_id", *COLUMN_DTYPES])
+    bin_ids, keys, rows, offsets = partition_index(paths, mmap_mode or "r")
+
+    data = {}
+    for column in columns:
+        if column == "bin_id":
+            data[column] = pd.Categorical.from_codes(
+                (keys >> 32).astype(np.int32), categories=bin_ids
+            )
+        else:
+            data[column] = gather_column(paths, column, rows, offsets, mmap_mode)
+    return data
+
+
+def load_prepared_data(output_dir=PREPARED_DATA_DIR, columns=None, mmap_mode=None):
+    """Prepared dataset as a DataFrame (see load_prepared_columns)"""
+    data = load_prepared_columns(columns, output_dir, mmap_mode)
+    # copy=False keeps memory-mapped columns as views
+    df = pd.DataFrame(data, copy=False)
+    if columns is None:
+        df.insert(5, "datetime", pd.to_datetime(df["timestamp"], unit="s"))
+    return df
+
+
+def load_state(output_dir=PREPARED_DATA_DIR):
+    """Incremental state, or None before the first run"""
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, output_dir=PREPARED_DATA_DIR):
+    """Write the state atomically; this commits a run"""
+    path = os.path.join(output_dir, STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def load_context(state, output_dir=PREPARED_DATA_DIR):
+    """Raw readings kept from earlier runs for recomputing bin tails"""
+    if not state.get("context"):
+        return pd.DataFrame({column: [] for column in RAW_COLUMNS})
+    path = os.path.join(output_dir, state["context"])
+    if path.endswith(".csv"):
+        return pd.read_csv(path)  # Written before context was typed
+    with open(os.path.join(path, "meta.json")) as f:
+        bin_ids = np.array(json.load(f)["bin_ids"], dtype=object)
+    context = {"bin_id": bin_ids[np.load(os.path.join(path, "bin_id.npy"))]}
+    for column in CONTEXT_DTYPES:
+        context[column] = np.load(os.path.join(path, f"{column}.npy"))
+    return pd.DataFrame(context, columns=RAW_COLUMNS)
+
+
+def remove_output(name, output_dir=PREPARED_DATA_DIR):
+    """Delete a file or directory in the output directory"""
+    path = os.path.join(output_dir, name)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def discard_uncommitted(state, output_dir=PREPARED_DATA_DIR):
+    """
+    Remove what a run that died before committing left behind: partitions
+    from its run number on and any context the state does not point to
+    """
+    for path in glob.glob(os.path.join(output_dir, "part-*[0-9]")):
+        if run_number(path) >= state["runs"]:
+            print(f"Removing uncommitted partition {path}")
+            shutil.rmtree(path)
+    for path in glob.glob(os.path.join(output_dir, "context-*[0-9]*")):
+        if os.path.basename(path) != state["context"]:
+            remove_output(os.path.basename(path), output_dir)
+
+
+def clear_prepared_data(output_dir=PREPARED_DATA_DIR):
+    """Remove partitions, context and state"""
+    for pattern in ["part-*", "context-*", STATE_FILE]:
+        for path in glob.glob(os.path.join(output_dir, pattern)):
+            remove_output(os.path.basename(path), output_dir)
+
+
+def advance_state(combined, bins):
+    """
+    Update each bin's state from this run's rows (sorted by bin and time)
+    and return the rows the next run needs as context: the rows whose
+    time_to_full is still an estimate (no full reading since) plus
+    ROLLING_WINDOW rows before them for the fill-rate features.
+    """
+    bin_ids = combined["bin_id"].to_numpy()
+    timestamps = combined["timestamp"].to_numpy()
+    is_full = combined["fill_level"].to_numpy() >= 100
+    segment, position = bin_segments(bin_ids)
+    starts = np.flatnonzero(position == 0)
+    ends = np.append(starts[1:], len(combined))
+
+    keep = np.zeros(len(combined), dtype=bool)
+    for start, end in zip(starts, ends):
+        bin_id, bin_ts = bin_ids[start], timestamps[start:end]
+        prev = bins.get(bin_id)
+
+        # First reading whose label is open: after the last full reading
+        full_positions = np.flatnonzero(is_full[start:end])
+        if len(full_positions):
+            open_pos = full_positions[-1] + 1
+        elif prev is None:
+            open_pos = 0
+        elif prev["open_from"] is None:
+            open_pos = np.searchsorted(bin_ts, prev["watermark"], side="right")
+        else:
+            open_pos = np.searchsorted(bin_ts, prev["open_from"], side="left")
+
+        keep[start + max(0, open_pos - ROLLING_WINDOW) : end] = True
+        new_rows = len(bin_ts) if prev is None else (bin_ts > prev["watermark"]).sum()
+        bins[bin_id] = {
+            "watermark": int(bin_ts[-1]),
+            "open_from": int(bin_ts[open_pos]) if open_pos < len(bin_ts) else None,
+            "rows": int((prev["rows"] if prev else 0) + new_rows),
+        }
+    return combined.loc[keep, RAW_COLUMNS]
+
+
+def select_output_rows(features, new, bins):
+    """
+    Rows to append: every new reading, plus earlier open readings of bins
+    that just reached 100% (their time_to_full changes from an estimate to
+    the observed value) and a bin's first reading once it has a second.
+    `bins` is the state before this run.
+    """
+    # NaN for bins seen for the first time (or without open readings)
+    watermark = features["bin_id"].map(
+        {bin_id: state["watermark"] for bin_id, state in bins.items()}
+    ).astype(float)
+    open_from = features["bin_id"].map(
+        {bin_id: state["open_from"] for bin_id, state in bins.items()}
+    ).astype(float)
+    filled = new.loc[new["fill_level"] >= 100, "bin_id"].unique()
+    single = [bin_id for bin_id, state in bins.items() if state["rows"] == 1]
+
+    mask = watermark.isna() | (features["timestamp"] > watermark)
+    mask |= features["bin_id"].isin(filled) & (features["timestamp"] >= open_from)
+    mask |= features["bin_id"].isin(single)
+    return features[mask]
+
+
+def compact_partitions(state, output_dir=PREPARED_DATA_DIR):
+    """Merge all partitions into one deduplicated partition, chunk by chunk"""
+    paths = partition_paths(output_dir)
+    bin_ids, keys, rows, offsets = partition_index(paths)
+    path = os.path.join(output_dir, f"part-{state['runs']:05d}")
+
+    writer = PartitionWriter(path)
+    for i in range(0, len(rows), COPY_CHUNK_ROWS):
+        chunk_rows = rows[i : i + COPY_CHUNK_ROWS]
+        chunk = {
+            column: gather_column(paths, column, chunk_rows, offsets)
+            for column in COLUMN_DTYPES
+        }
+        chunk["bin_id"] = bin_ids[keys[i : i + COPY_CHUNK_ROWS] >> 32]
+        writer.append(pd.DataFrame(chunk))
+    writer.close()
+
+    state["runs"] += 1
+    save_state(state, output_dir)
+    for old_path in paths:
+        shutil.rmtree(old_path)
+    print(f"Compacted {len(paths)} partitions into {path}")
+
+
+def prepare_batch(new, context, bins):
+    """
+    Featurize one batch of bins: recompute each bin's tail from its kept
+    context plus new readings. Returns (rows to append, context to keep);
+    `bins` (the state) is advanced in place.
+    """
+    combined = pd.concat([context, new[RAW_COLUMNS]], ignore_index=True)
+    combined = combined.drop_duplicates(subset=["bin_id", "timestamp"], keep="last")
+    combined = combined.sort_values(["bin_id", "timestamp"]).reset_index(drop=True)
+    combined["datetime"] = pd.to_datetime(combined["timestamp"], unit="s")
+
+    previous_bins = {
+        bin_id: dict(bins[bin_id]) for bin_id in new["bin_id"].unique() if bin_id in bins
+    }
+    features = engineer_features(combined.copy())
+    output = select_output_rows(features, new, previous_bins)
+    return output, advance_state(combined, bins)
+
+
+def prepare_data(output_dir=PREPARED_DATA_DIR, full=False):
+    """
+    Fetch readings newer than the last run, featurize only the affected
+    bin tails and append them as a new partition. The first run (or
+    full=True) processes all of /history. Bins are fetched, featurized and
+    written in batches of INGEST_BATCH_BINS. Returns the appended row count.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = None if full else load_state(output_dir)
+    if state is None:
+        clear_prepared_data(output_dir)
+        state = {"runs": 0, "context": None, "bins": {}}
+    else:
+        discard_uncommitted(state, output_dir)
+
+    watermarks = {bin_id: s["watermark"] for bin_id, s in state["bins"].items()}
+    context = load_context(state, output_dir)
+    run = state["runs"]
+    part_path = os.path.join(output_dir, f"part-{run:05d}")
+    writer = PartitionWriter(part_path)
+    kept, touched, new_records = [], set(), 0
+
+    print("Fetching historical data...")
+    try:
+        for batch_bins, raw in iter_history_batches(watermarks):
+            new = clean_data(raw)
+            if new.empty:
+                continue
+            batch_touched = set(new["bin_id"].unique())
+            batch_context = context[context["bin_id"].isin(batch_touched)]
+            output, batch_kept = prepare_batch(new, batch_context, state["bins"])
+
+            writer.append(output)
+            kept.append(batch_kept)
+            touched |= batch_touched
+            new_records += len(new)
+            print(
+                f"Batch {batch_bins[0]}..{batch_bins[-1]}: {len(new)} new readings, "
+                f"{len(output)} records appended"
+            )
+    except BaseException:
+        writer.discard()
+        raise
 
+    if not new_records:
+        writer.discard()
+        if run == 0:
+            raise ValueError("No historical data found in Firebase")
+        print("No new readings since the last run")
+        return 0
+
+    # Partition first, then context, then the state that commits the run
+    writer.close()
+    old_context = state["context"]
+    state["context"] = f"context-{run:05d}"
+    untouched = context[~context["bin_id"].isin(touched)]
+    write_partition(
+        pd.concat([untouched, *kept], ignore_index=True),
+        os.path.join(output_dir, state["context"]),
+        CONTEXT_DTYPES,
+    )
+    state["runs"] = run + 1
+    state["updated_at"] = datetime.now().isoformat()
+    save_state(state, output_dir)
+    if old_context:
+        remove_output(old_context, output_dir)
+
+    print(
+        f"Appended {writer.rows} records from {new_records} new readings "
+        f"({len(touched)} bins) to {part_path}"
+    )
+    if len(partition_paths(output_dir)) > MAX_PARTITIONS:
+        compact_partitions(state, output_dir)
+    return writer.rows
+
+
+def print_dataset_summary(df):
+    """Print size and target statistics of the prepared dataset"""
     print("\n=== Dataset Summary ===")
     print(f"Total records: {len(df)}")
     print(f"Unique bins: {df['bin_id'].nunique()}")
@@ -211,11 +743,11 @@ def save_prepared_data(df, output_path="data/prepared_data.csv"):
 
 def main():
     try:
-        init_firebase()
-        df = fetch_historical_data()
-        df = clean_data(df)
-        df = engineer_features(df)
-        save_prepared_data(df)
+        full = "--full" in sys.argv[1:]
+        prepare_data(full=full)
+        print_dataset_summary(
+            load_prepared_data(columns=["bin_id", "time_to_full_hours"], mmap_mode="r")
+        )
         print("\n✓ Data preparation completed successfully!")
     except Exception as e:
         print(f"Error during data preparation: {e}")
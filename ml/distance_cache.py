@@ -0,0 +1,264 @@
+"""
+Distance Cache
+Persistent, incrementally updated distance matrix for routing.
+
+Bin coordinates are static and consecutive routing runs mostly select the
+same bins, so pairwise distances are computed once and stored on disk:
+  index.json  - bin id and last use per slot, and the distance metric
+  coords.npy  - (lat, lon) per slot, used to detect moved bins / depot
+  matrix.npy  - capacity x capacity int32 meters, opened memory-mapped
+
+Only rows/columns for new or moved bins are computed; each run's matrix is
+a slice of the cached one. At most MAX_SLOTS locations are kept: beyond
+that the least recently used bins give up their slots. The API and CLI
+may share the directory, so every access holds a file lock and picks up
+the other process's writes first.
+"""
+
+import json
+import os
+import threading
+import numpy as np
+
+from file_lock import file_lock
+from geo import haversine_meters
+
+# Configuration
+DISTANCE_CACHE_DIR = "data/distance_cache"
+INITIAL_CAPACITY = 256  # Slots allocated on first use; doubles when full
+# Locations kept (64 MB of int32 at 4096); least recently used are evicted
+MAX_SLOTS = int(os.environ.get("ROUTING_DISTANCE_CACHE_MAX_SLOTS", 4096))
+COORD_TOLERANCE = 1e-7  # Degrees; larger coordinate changes invalidate a slot
+COMPUTE_CHUNK = 256  # Dirty rows computed per block to bound temporary memory
+
+DEPOT_KEY = "__depot__"
+
+
+class DistanceCache:
+    """
+    Disk-backed distance matrix keyed by bin id.
+    distance_fn(lat_a, lon_a, lat_b, lon_b) returns a meters matrix; set
+    symmetric=False for metrics such as road networks where A->B != B->A.
+    """
+
+    def __init__(
+        self,
+        cache_dir=DISTANCE_CACHE_DIR,
+        distance_fn=haversine_meters,
+        symmetric=True,
+        dtype=np.int32,
+        max_slots=MAX_SLOTS,
+    ):
+        self.cache_dir = cache_dir
+        self.distance_fn = distance_fn
+        self.metric = getattr(distance_fn, "__name__", "custom")
+        self.symmetric = symmetric
+        self.dtype = np.dtype(dtype)
+        self.max_slots = max_slots
+        self.lock = threading.Lock()
+
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.coords_path = os.path.join(cache_dir, "coords.npy")
+        self.matrix_path = os.path.join(cache_dir, "matrix.npy")
+        self.lock_path = os.path.join(cache_dir, "cache")
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with file_lock(self.lock_path):
+            self._load()
+
+    def _index_version(self):
+        """Write counter stored in index.json (None if missing)"""
+        try:
+            with open(self.index_path) as f:
+                return json.load(f).get("generation")
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        """Open the cache from disk, or start an empty one (file lock held)"""
+        self.slot_ids = []
+        self.slots = {}
+        self.last_used = np.empty(0, dtype=np.int64)
+        self.clock = 0
+        self.coords = np.empty((0, 2))
+        self.matrix = None
+
+        if os.path.exists(self.index_path) and os.path.exists(self.matrix_path):
+            with open(self.index_path) as f:
+                meta = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode="r+")
+            # A different metric or dtype means every cached value is invalid
+            if meta.get("metric") == self.metric and matrix.dtype == self.dtype:
+                self.slot_ids = meta["slot_ids"]
+                self.slots = {key: i for i, key in enumerate(self.slot_ids)}
+                self.last_used = np.asarray(
+                    meta.get("last_used", [0] * len(self.slot_ids)), dtype=np.int64
+                )
+                self.clock = meta.get("clock", 0)
+                self.version = meta.get("generation")
+                self.coords = np.load(self.coords_path)
+                self.matrix = matrix
+            else:
+                print("Distance cache metric changed; rebuilding")
+                del matrix
+
+        if self.matrix is None:
+            self.version = self._index_version()
+            self.matrix = self._allocate(min(INITIAL_CAPACITY, self.max_slots))
+
+    def _allocate(self, capacity):
+        """Create a fresh memory-mapped matrix file of the given capacity"""
+        tmp_path = f"{self.matrix_path}.tmp"
+        matrix = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, capacity)
+        )
+        if self.matrix is not None:
+            # Carry over the filled block (slots beyond it are recomputed)
+            size = min(len(self.slot_ids), self.matrix.shape[0])
+            matrix[:size, :size] = self.matrix[:size, :size]
+        matrix.flush()
+        del matrix
+        self.matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        return np.load(self.matrix_path, mmap_mode="r+")
+
+    def _save(self):
+        """Flush the matrix and write coords and the slot index atomically"""
+        self.matrix.flush()
+        tmp_path = f"{self.coords_path}.tmp.npy"
+        np.save(tmp_path, self.coords)
+        os.replace(tmp_path, self.coords_path)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "metric": self.metric,
+                    "slot_ids": self.slot_ids,
+                    "last_used": self.last_used.tolist(),
+                    "clock": self.clock,
+                    "generation": (self.version or 0) + 1,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.index_path)
+        self.version = (self.version or 0) + 1
+
+    def _free_slots(self, keys):
+        """
+        Slots for the keys not cached yet: unused capacity first, then the
+        least recently used slots of bins outside this request
+        """
+        needed = len({key for key in keys if key not in self.slots})
+        evict = needed - max(0, self.max_slots - len(self.slot_ids))
+        if evict <= 0:
+            return []
+        wanted = {self.slots[key] for key in keys if key in self.slots}
+        candidates = np.setdiff1d(
+            np.arange(len(self.slot_ids)), np.fromiter(wanted, dtype=np.int64)
+        )
+        victims = candidates[np.argsort(self.last_used[candidates], kind="stable")]
+        victims = victims[:evict].tolist()
+        for slot in victims:
+            del self.slots[self.slot_ids[slot]]
+        print(f"Distance cache full: evicted {len(victims)} least recently used bins")
+        return victims
+
+    def _assign(self, key, lat, lon, dirty, new_coords, free):
+        """Return the slot for key, allocating or invalidating it as needed"""
+        slot = self.slots.get(key)
+        if slot is None and free:
+            # Reuse an evicted slot: its row/column is recomputed
+            slot = free.pop()
+            self.slot_ids[slot] = key
+            self.slots[key] = slot
+            self.coords[slot] = (lat, lon)
+            dirty.append(slot)
+        elif slot is None:
+            slot = len(self.slot_ids)
+            self.slot_ids.append(key)
+            self.slots[key] = slot
+            new_coords.append((lat, lon))
+            dirty.append(slot)
+        elif np.abs(self.coords[slot] - (lat, lon)).max() > COORD_TOLERANCE:
+            # Bin moved (or depot changed): its whole row/column is stale
+            self.coords[slot] = (lat, lon)
+            dirty.append(slot)
+        return slot
+
+    def _compute(self, dirty):
+        """Recompute rows and columns for dirty slots against every slot"""
+        size = len(self.slot_ids)
+        if size > self.matrix.shape[0]:
+            self.matrix = self._allocate(
+                min(max(size, 2 * self.matrix.shape[0]), self.max_slots)
+            )
+
+        lat, lon = self.coords[:, 0], self.coords[:, 1]
+        dirty = np.asarray(dirty)
+        for i in range(0, len(dirty), COMPUTE_CHUNK):
+            rows = dirty[i : i + COMPUTE_CHUNK]
+            block = self.distance_fn(lat[rows], lon[rows], lat, lon).astype(self.dtype)
+            self.matrix[rows, :size] = block
+            if self.symmetric:
+                self.matrix[:size, rows] = block.T
+            else:
+                self.matrix[:size, rows] = self.distance_fn(
+                    lat, lon, lat[rows], lon[rows]
+                ).astype(self.dtype)
+
+    def submatrix(self, bin_ids, latitudes, longitudes, depot):
+        """
+        Return the distance matrix for [depot] + bin_ids (in that order),
+        computing only entries for bins that are new or have moved.
+        """
+        keys = [DEPOT_KEY, *bin_ids]
+        if len(set(keys)) > self.max_slots:
+            # Larger than the whole cache: compute without caching
+            print(f"Distance cache: {len(keys)} locations exceed {self.max_slots} slots")
+            lat = np.concatenate([[depot[0]], np.asarray(latitudes, dtype=np.float64)])
+            lon = np.concatenate([[depot[1]], np.asarray(longitudes, dtype=np.float64)])
+            return self.distance_fn(lat, lon, lat, lon).astype(self.dtype)
+
+        with self.lock, file_lock(self.lock_path):
+            if self._index_version() != self.version:
+                self._load()  # Another process updated the cache
+            dirty, new_coords = [], []
+            free = self._free_slots(keys)
+            index = [
+                self._assign(DEPOT_KEY, depot[0], depot[1], dirty, new_coords, free)
+            ]
+            for bin_id, lat, lon in zip(bin_ids, latitudes, longitudes):
+                index.append(
+                    self._assign(
+                        bin_id, float(lat), float(lon), dirty, new_coords, free
+                    )
+                )
+            if new_coords:
+                self.coords = np.vstack([self.coords, new_coords])
+                self.last_used = np.concatenate(
+                    [self.last_used, np.zeros(len(new_coords), dtype=np.int64)]
+                )
+
+            self.clock += 1
+            self.last_used[index] = self.clock
+            if dirty:
+                self._compute(dirty)
+            self._save()
+
+            reused = len(index) - len(dirty)
+            print(
+                f"Distance cache: {reused}/{len(index)} locations reused, "
+                f"{len(dirty)} rows computed"
+            )
+            index = np.asarray(index)
+            return np.array(self.matrix[np.ix_(index, index)])
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self.lock, file_lock(self.lock_path):
+            self.slot_ids = []
+            self.slots = {}
+            self.last_used = np.empty(0, dtype=np.int64)
+            self.coords = np.empty((0, 2))
+            self.matrix = self._allocate(min(INITIAL_CAPACITY, self.max_slots))
+            self._save()
@@ -0,0 +1,309 @@
+"""
+Fleet Cache
+Resident in-memory mirror of /bins, /predictions and each bin's recent
+history, for long-lived processes such as the API server.
+
+- /bins is kept current by the storage change stream (listen_bins)
+- /predictions uses its change stream where the backend has one (Firebase)
+  and is otherwise polled every PREDICTIONS_POLL_SECONDS; this process's
+  own prediction writes are applied immediately (write-through)
+- each bin's last history_limit readings are seeded from /history once,
+  then extended from /bins events
+
+Readers call get_reader(): the running cache, or the storage backend when
+no cache is running. Both answer get_bins(), get_predictions() and
+get_histories(), so inference and routing work either way.
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+
+from storage import apply_multipath_update, get_storage, points_to_frame
+
+# Configuration
+HISTORY_WINDOW = 10  # Readings kept per bin
+PREDICTIONS_POLL_SECONDS = 30.0  # Refresh interval without a change stream
+READY_TIMEOUT = 60.0  # Seconds start() waits for the initial snapshots
+
+_active = None
+_active_lock = threading.Lock()
+_starter = None
+_starter_lock = threading.Lock()
+
+
+def apply_event(tree, event):
+    """Apply a change-stream event (put/patch at a path) to a nested dict"""
+    path = event.path.strip("/")
+    if not path:
+        if event.event_type == "patch":
+            apply_multipath_update(tree, event.data or {})
+        else:
+            tree.clear()
+            tree.update(event.data or {})
+    elif event.event_type == "patch":
+        children = event.data or {}
+        apply_multipath_update(
+            tree, {f"{path}/{key}": value for key, value in children.items()}
+        )
+    else:
+        apply_multipath_update(tree, {path: event.data})
+
+
+def deep_sizeof(obj):
+    """Approximate memory footprint (bytes) of nested containers"""
+    size, stack, seen = 0, [obj], set()
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, deque)):
+            stack.extend(item)
+    return size
+
+
+class FleetCache:
+    """In-memory mirror of fleet state with hit/miss accounting"""
+
+    def __init__(self, storage=None, history_limit=HISTORY_WINDOW):
+        self.storage = storage or get_storage()
+        self.history_limit = history_limit
+        self.lock = threading.Lock()
+
+        self.bins = {}
+        self.predictions = {}
+        self.windows = {}  # bin_id -> deque of (timestamp, fill_level)
+        self.bins_updated_at = None
+        self.predictions_updated_at = None
+        self.predictions_source = None  # "listener" or "polling"
+        self.version = 0  # Bumped on every change, for derived views
+
+        self.hits = 0
+        self.misses = 0
+        self.ready = threading.Event()
+        self._bins_loaded = threading.Event()
+        self._predictions_loaded = threading.Event()
+        self._stopped = threading.Event()
+        self._registrations = []
+        self._poller = None
+
+    # --- Lifecycle ---
+    def start(self, timeout=READY_TIMEOUT):
+        """Subscribe to changes, seed history windows and wait until ready"""
+        self._registrations.append(self.storage.listen_bins(self._on_bins_event))
+
+        registration = self.storage.listen_predictions(self._on_predictions_event)
+        if registration is not None:
+            self.predictions_source = "listener"
+            self._registrations.append(registration)
+        else:
+            self.predictions_source = "polling"
+            self._poller = threading.Thread(
+                target=self._poll_predictions, daemon=True
+            )
+            self._poller.start()
+
+        self._bins_loaded.wait(timeout)
+        with self.lock:
+            bin_ids = list(self.bins)
+        history_df = self.storage.get_histories(bin_ids, self.history_limit)
+        with self.lock:
+            for bin_id, group in history_df.groupby("bin_id", sort=False):
+                points = list(zip(group["ts"], group["fill"]))
+                # Keep readings that arrived while /history was being read
+                newer = [
+                    p for p in self.windows.get(bin_id, ()) if p[0] > points[-1][0]
+                ]
+                self.windows[bin_id] = deque(
+                    points + newer, maxlen=self.history_limit
+                )
+
+        self._predictions_loaded.wait(timeout)
+        self.ready.set()
+        print(
+            f"✓ Fleet cache ready: {len(self.bins)} bins, "
+            f"{len(self.predictions)} predictions (predictions via "
+            f"{self.predictions_source})"
+        )
+        return self
+
+    def close(self):
+        self._stopped.set()
+        for registration in self._registrations:
+            registration.close()
+        if self._poller is not None:
+            self._poller.join()
+
+    # --- Change handling ---
+    def _record_reading(self, bin_id):
+        """Push a bin's current reading onto its window (lock held)"""
+        state = self.bins.get(bin_id)
+        if not isinstance(state, dict):
+            self.windows.pop(bin_id, None)
+            return
+        try:
+            fill = float(state.get("fill_level", 0))
+            ts = float(state.get("timestamp", time.time()))
+        except (TypeError, ValueError):
+            return
+        window = self.windows.setdefault(bin_id, deque(maxlen=self.history_limit))
+        # Replays and out-of-order readings would break time order
+        if not window or ts > window[-1][0]:
+            window.append((ts, fill))
+
+    def _on_bins_event(self, event):
+        with self.lock:
+            apply_event(self.bins, event)
+            self.bins_updated_at = time.time()
+            self.version += 1
+            # The initial snapshot's windows are seeded from /history instead
+            if self._bins_loaded.is_set():
+                parts = [p for p in event.path.split("/") if p]
+                for bin_id in parts[:1] or list(event.data or {}):
+                    self._record_reading(bin_id)
+        self._bins_loaded.set()
+
+    def _on_predictions_event(self, event):
+        with self.lock:
+            apply_event(self.predictions, event)
+            self.predictions_updated_at = time.time()
+            self.version += 1
+        self._predictions_loaded.set()
+
+    def _poll_predictions(self):
+        while True:
+            predictions = self.storage.get_predictions()
+            with self.lock:
+                if predictions != self.predictions:
+                    self.version += 1
+                self.predictions = predictions
+                self.predictions_updated_at = time.time()
+            self._predictions_loaded.set()
+            if self._stopped.wait(PREDICTIONS_POLL_SECONDS):
+                return
+
+    def apply_prediction_updates(self, updates):
+        """Write-through for this process's own /predictions updates"""
+        with self.lock:
+            apply_multipath_update(self.predictions, updates)
+            self.predictions_updated_at = time.time()
+            self.version += 1
+
+    # --- Reads (same signatures as Storage) ---
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_bins(self):
+        if not self.ready.is_set():
+            self._count(False)
+            return self.storage.get_bins()
+        self._count(True)
+        with self.lock:
+            return {
+                bin_id: dict(state) if isinstance(state, dict) else state
+                for bin_id, state in self.bins.items()
+            }
+
+    def get_predictions(self):
+        if not self.ready.is_set():
+            self._count(False)
+            return self.storage.get_predictions()
+        self._count(True)
+        with self.lock:
+            return {
+                bin_id: dict(pred) if isinstance(pred, dict) else pred
+                for bin_id, pred in self.predictions.items()
+            }
+
+    def get_histories(self, bin_ids, limit):
+        """Columnar history windows; falls back to storage for longer windows"""
+        if not self.ready.is_set() or limit is None or limit > self.history_limit:
+            self._count(False)
+            return self.storage.get_histories(bin_ids, limit)
+        self._count(True)
+        start = time.perf_counter()
+        with self.lock:
+            bin_points = [
+                (bin_id, list(self.windows.get(bin_id, ()))[-limit:])
+                for bin_id in bin_ids
+            ]
+        history_df = points_to_frame(bin_points)
+        history_df.attrs["fetch_stats"] = {
+            "requests": 0,
+            "fetch_seconds": time.perf_counter() - start,
+        }
+        return history_df
+
+    # --- Introspection ---
+    def stats(self):
+        """Cache age, hit rate and approximate memory footprint"""
+        now = time.time()
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "ready": self.ready.is_set(),
+                "bins": len(self.bins),
+                "predictions": len(self.predictions),
+                "history_bins": len(self.windows),
+                "predictions_source": self.predictions_source,
+                "version": self.version,
+                "bins_age_s": (
+                    round(now - self.bins_updated_at, 3)
+                    if self.bins_updated_at
+                    else None
+                ),
+                "predictions_age_s": (
+                    round(now - self.predictions_updated_at, 3)
+                    if self.predictions_updated_at
+                    else None
+                ),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "memory_bytes": deep_sizeof(
+                    (self.bins, self.predictions, self.windows)
+                ),
+            }
+
+
+def start_fleet_cache(history_limit=HISTORY_WINDOW):
+    """Start the process-wide cache (idempotent) and return it"""
+    global _active
+    with _active_lock:
+        if _active is None:
+            _active = FleetCache(history_limit=history_limit).start()
+        return _active
+
+
+def start_fleet_cache_background(history_limit=HISTORY_WINDOW):
+    """
+    Start the process-wide cache on a daemon thread (idempotent). Readers
+    use storage until it is ready, so callers never wait for the snapshots.
+    """
+    global _starter
+    with _starter_lock:
+        if _starter is None and _active is None:
+            _starter = threading.Thread(
+                target=start_fleet_cache, args=(history_limit,), daemon=True
+            )
+            _starter.start()
+
+
+def get_fleet_cache():
+    """The running cache, or None"""
+    return _active
+
+
+def get_reader():
+    """Where to read fleet state from: the running cache, else storage"""
+    return _active or get_storage()
@@ -0,0 +1,81 @@
+"""
+Geo Utilities
+Great-circle distance helpers shared by routing and the distance cache.
+"""
+
+import numpy as np
+from math import radians, cos, sin, asin, sqrt
+
+# Radius of earth in kilometers
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Calculate the great circle distance between two points
+    on the earth (specified in decimal degrees).
+    Returns distance in kilometers.
+    """
+    # Convert decimal degrees to radians
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+
+    # Haversine formula
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+
+    # Radius of earth in kilometers
+    r = EARTH_RADIUS_KM
+
+    return c * r
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """
+    Vectorized haversine: distances (km) between every point in
+    (lat1, lon1) and every point in (lat2, lon2), via NumPy broadcasting.
+    Uses the same formula as haversine_distance.
+    """
+    lat1, lon1 = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    lat2, lon2 = np.radians(lat2)[None, :], np.radians(lon2)[None, :]
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(a))
+
+    return c * EARTH_RADIUS_KM
+
+
+def haversine_pairs(lat1, lon1, lat2, lon2):
+    """
+    Element-wise haversine: distance (km) from each (lat1[i], lon1[i]) to
+    (lat2[i], lon2[i]), for sparse arc lists. Same formula as
+    haversine_distance.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(a))
+
+    return c * EARTH_RADIUS_KM
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """Pairwise haversine distances in meters (see haversine_matrix)"""
+    return haversine_matrix(lat1, lon1, lat2, lon2) * 1000
+
+
+def project_to_plane(latitudes, longitudes, origin_lat, origin_lon):
+    """
+    Equirectangular projection of degrees to (x, y) kilometers around an
+    origin. Accurate to well under 1% over city-sized areas.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    x = np.radians(longitudes - origin_lon) * np.cos(np.radians(origin_lat))
+    y = np.radians(latitudes - origin_lat)
+    return x * EARTH_RADIUS_KM, y * EARTH_RADIUS_KM
@@ -6,33 +6,62 @@ and predicts time-to-full.
 
 import numpy as np
 import pandas as pd
-import firebase_admin
-from firebase_admin import credentials, db
 import time
 import joblib
+import json
+import os
+import threading
 from datetime import datetime
 
+from fleet_cache import get_fleet_cache, get_reader
+from storage import get_storage, history_to_points
+
 # Configuration
 HISTORY_LIMIT = 10  # Number of past data points to check for fill rate
 
-
-def init_firebase():
-    """Initialize Firebase Admin SDK if not already initialized"""
-    if not firebase_admin._apps:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(
-            cred,
-            {
-                "databaseURL": "https://smart-waste-3d7d0-default-rtdb.europe-west1.firebasedatabase.app/"
-            },
-        )
+# Predictor: "heuristic" (fill-rate slope) or "model" (trained RandomForest)
+PREDICTOR = os.environ.get("INFERENCE_PREDICTOR", "heuristic")
+MODEL_PATH = "models/time_to_full.joblib"
+# Optional joblib mmap_mode (e.g. "r") so worker processes share model pages
+MODEL_MMAP_MODE = os.environ.get("INFERENCE_MODEL_MMAP_MODE") or None
+MODEL_BATCH_SIZE = 50000  # Rows per model.predict call
+
+# Write-back: "delta" uploads only bins that moved, "full" rewrites every bin
+WRITE_MODE = os.environ.get("INFERENCE_WRITE_MODE", "delta")
+PUBLISHED_SNAPSHOT_PATH = "data/published_predictions.json"
+# A bin is re-uploaded when any of these fields moved further than this
+PREDICTION_TOLERANCES = {
+    "fill_level": 0.5,  # percent
+    "fill_rate": 0.05,  # percent per hour
+    "time_to_full_h": 0.25,  # hours
+}
+# Re-upload unchanged bins at least this often so predicted_at stays fresh
+PREDICTION_REFRESH_SECONDS = 3600
+
+# Process-resident model, loaded lazily on first use
+_model_cache = {"model": None, "feature_cols": None}
+_model_lock = threading.Lock()
+
+PREDICTION_FIELDS = [
+    "fill_level",
+    "fill_rate",
+    "time_to_full_h",
+    "predicted_at",
+    "predictor",
+    "model_load_ms",
+    "predict_ms",
+]
+
+# Last published /predictions values for the active storage backend.
+# Persisted to PUBLISHED_SNAPSHOT_PATH for Firebase; in memory for local backends.
+_published = {"storage": None, "snapshot": None}
+_published_lock = threading.Lock()
 
 
 def fetch_current_bin_states():
     """Fetch current state of all bins"""
     print("Fetching current bin states...")
-    ref = db.reference("/bins")
-    data = ref.get()
+    data = get_reader().get_bins()
 
     if not data:
         return pd.DataFrame()
@@ -58,37 +87,36 @@ def fetch_current_bin_states():
 
 def fetch_bin_history(bin_id):
     """Fetch historical data for a specific bin"""
-    # Get last N records
-    ref = db.reference(f"/history/{bin_id}")
     # Limit to last 10 entries to calculate recent rate
-    data = ref.order_by_key().limit_to_last(HISTORY_LIMIT).get()
-
-    if not data:
-        return {}
-    return data
+    return get_storage().get_history(bin_id, HISTORY_LIMIT)
 
 
-def compute_fill_rate_from_history(current_fill, current_time, history):
+def fetch_bin_histories(bin_ids, limit=HISTORY_LIMIT):
     """
-    Calculate fill rate (percent per hour) based on history.
-    FIXED: Handles String timestamps from Firebase.
+    Fetch the last `limit` history entries for many bins in one bulk pass
+    (concurrent requests on Firebase, one local read on SQLite).
+    Returns a columnar DataFrame (bin_id, ts, fill) sorted by bin and time.
     """
-    if not history or len(history) < 2:
-        return 0.5, 0, 0  # Default fallback rate
+    bin_ids = list(bin_ids)
+    print(f"Fetching history for {len(bin_ids)} bins (limit={limit})...")
+
+    history_df = get_reader().get_histories(bin_ids, limit)
+
+    stats = history_df.attrs["fetch_stats"]
+    print(
+        f"Fetched {len(history_df)} history points with {stats['requests']} requests "
+        f"in {stats['fetch_seconds']:.2f}s"
+    )
+    return history_df
 
-    # 1. Convert Dictionary to List of (Timestamp, Fill)
-    points = []
-    for ts_str, data in history.items():
-        try:
-            # FIX: Force convert String timestamp to Float
-            ts = float(ts_str)
-            fill = float(data.get("fill_level", 0))
-            points.append((ts, fill))
-        except ValueError:
-            continue
 
+def compute_fill_rate_from_points(points):
+    """
+    Calculate fill rate (percent per hour) from (timestamp, fill) tuples.
+    Returns the default rate when the window is too short or the bin was emptied.
+    """
     # Sort by time
-    points.sort(key=lambda x: x[0])
+    points = sorted(points, key=lambda x: x[0])
 
     if len(points) < 2:
         return 0.5, 0, 0
@@ -117,10 +145,184 @@ def compute_fill_rate_from_history(current_fill, current_time, history):
     return fill_rate, 0, 0
 
 
-def prepare_features_for_prediction(bins_df):
-    """Calculate fill rate for each bin"""
-    print("Preparing features for prediction...")
-    current_time = time.time()
+def compute_fill_rate_from_history(current_fill, current_time, history):
+    """
+    Calculate fill rate (percent per hour) based on history.
+    FIXED: Handles String timestamps from Firebase.
+    """
+    if not history or len(history) < 2:
+        return 0.5, 0, 0  # Default fallback rate
+
+    return compute_fill_rate_from_points(history_to_points(history))
+
+
+def history_to_ragged(history_df, bin_ids):
+    """
+    Lay the columnar history out as ragged arrays plus per-bin offsets.
+    Returns (ts, fill, starts, counts) where bin i's time-ordered window is
+    ts[starts[i]:starts[i] + counts[i]].
+    """
+    n_bins = len(bin_ids)
+    if history_df.empty:
+        empty = np.empty(0, dtype=np.float64)
+        zeros = np.zeros(n_bins, dtype=np.int64)
+        return empty, empty, zeros, zeros
+
+    # Map every history point to its bin's position; unknown bins get -1
+    point_codes, point_bins = pd.factorize(history_df["bin_id"])
+    codes = pd.Index(bin_ids).get_indexer(point_bins)[point_codes]
+    ts = history_df["ts"].to_numpy(dtype=np.float64)
+    fill = history_df["fill"].to_numpy(dtype=np.float64)
+
+    known = codes >= 0
+    codes, ts, fill = codes[known], ts[known], fill[known]
+
+    # Stable sort by (bin, ts) so ragged rows are contiguous and time-ordered
+    order = np.lexsort((ts, codes))
+    ts, fill = ts[order], fill[order]
+
+    counts = np.bincount(codes, minlength=n_bins)
+    starts = np.cumsum(counts) - counts
+
+    return ts, fill, starts, counts
+
+
+def compute_fill_rates_batch(history_df, bin_ids):
+    """
+    Vectorized equivalent of compute_fill_rate_from_points for many bins.
+    The slope between each window's oldest and newest point is computed
+    over the ragged history with a handful of NumPy operations.
+    Returns a float64 array of fill rates aligned with `bin_ids`.
+    """
+    fill_rate = np.full(len(bin_ids), 0.5)  # Default fallback rate
+
+    ts, fill, starts, counts = history_to_ragged(history_df, bin_ids)
+
+    has_window = counts >= 2
+    first = starts[has_window]
+    last = first + counts[has_window] - 1
+
+    # Slope between oldest and newest point in each window
+    time_diff_hours = (ts[last] - ts[first]) / 3600.0
+    fill_diff = fill[last] - fill[first]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = fill_diff / time_diff_hours
+
+    # Zero time span or emptied bin (negative slope) -> default slow rate
+    rates = np.where((time_diff_hours > 0) & (rates >= 0), rates, 0.5)
+    fill_rate[has_window] = rates
+
+    return fill_rate
+
+
+def compute_model_features_batch(bins_df, history_df, current_time, window=3):
+    """
+    Build every model feature for the whole fleet in one vectorized pass.
+    Mirrors data_prep: per-reading fill rates clipped at 0 (0 for a bin's
+    first reading), rolling mean/std over the last `window` rates, and
+    calendar features from the bin's last update time.
+    """
+    bin_ids = bins_df["bin_id"].to_numpy()
+    n_bins = len(bin_ids)
+
+    ts, fill, starts, counts = history_to_ragged(history_df, bin_ids)
+
+    # Per-reading fill rate (percent per hour) inside each bin's window
+    point_rate = np.zeros(len(ts))
+    if len(ts) > 1:
+        time_diff_hours = np.diff(ts) / 3600.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.where(
+                time_diff_hours > 0, np.diff(fill) / time_diff_hours, 0.0
+            )
+        point_rate[1:] = np.clip(rate, 0, None)
+    # First reading of each bin has no previous data
+    point_rate[starts[counts > 0]] = 0.0
+
+    # Gather the last `window` rates per bin into a padded (n_bins, window) block
+    last = starts + counts - 1
+    offsets = np.arange(window - 1, -1, -1)
+    idx = last[:, None] - offsets[None, :]
+    valid = (idx >= starts[:, None]) & (counts[:, None] > 0)
+    # Out-of-window slots point at a trailing NaN sentinel
+    block = np.append(point_rate, np.nan)[np.where(valid, idx, len(point_rate))]
+
+    n_valid = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling_mean = np.nansum(block, axis=1) / n_valid
+        rolling_var = (
+            np.nansum((block - rolling_mean[:, None]) ** 2, axis=1) / (n_valid - 1)
+        )
+    rolling_mean = np.where(n_valid > 0, rolling_mean, 0.0)
+    rolling_std = np.where(n_valid > 1, np.sqrt(rolling_var), 0.0)
+
+    latest_rate = np.zeros(n_bins)
+    has_points = counts > 0
+    latest_rate[has_points] = point_rate[last[has_points]]
+
+    if "last_updated" in bins_df:
+        updated_at = bins_df["last_updated"].to_numpy(dtype=np.float64)
+    else:
+        updated_at = np.full(n_bins, current_time)
+    updated_dt = pd.DatetimeIndex(pd.to_datetime(updated_at, unit="s"))
+    weekday = updated_dt.weekday.to_numpy()
+
+    return pd.DataFrame(
+        {
+            "bin_id": bin_ids,
+            "fill_level": bins_df["fill_level"].to_numpy(dtype=np.float64),
+            "fill_rate": latest_rate,
+            "fill_rate_rolling_mean": rolling_mean,
+            "fill_rate_rolling_std": rolling_std,
+            "hour": updated_dt.hour.to_numpy(),
+            "weekday": weekday,
+            "is_weekend": (weekday >= 5).astype(int),
+        }
+    )
+
+
+def round_like_python(values, decimals):
+    """
+    Vectorized round() that matches Python's built-in rounding.
+    np.round scales by 10**decimals first, which can flip exact-tie values;
+    the few near-tie elements are re-rounded with round() itself.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+
+    scaled = values * 10.0**decimals
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), decimals)
+
+    return rounded
+
+
+def compute_time_to_full_batch(current_fill, fill_rate):
+    """
+    Vectorized remaining-capacity / fill-rate logic with the 24h slow-fill
+    fallback and the 48h cap.
+    """
+    remaining_capacity = 100.0 - np.asarray(current_fill, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        time_to_full = np.where(
+            fill_rate <= 0.1, 24.0, remaining_capacity / fill_rate
+        )
+
+    time_to_full = np.where(remaining_capacity <= 0, 0.0, time_to_full)
+
+    # Cap prediction at 48 hours to be realistic
+    return np.minimum(time_to_full, 48.0)
+
+
+def predict_time_to_full_scalar(bins_df, history_df, current_time):
+    """Reference per-bin implementation of the fill-rate heuristic"""
+    points_by_bin = {
+        bin_id: list(zip(group["ts"], group["fill"]))
+        for bin_id, group in history_df.groupby("bin_id", sort=False)
+    }
 
     predictions = []
 
@@ -128,12 +330,9 @@ def prepare_features_for_prediction(bins_df):
         bin_id = row["bin_id"]
         current_fill = row["fill_level"]
 
-        # Fetch history for this bin
-        history = fetch_bin_history(bin_id)
-
         # Compute Rate
-        fill_rate, _, _ = compute_fill_rate_from_history(
-            current_fill, current_time, history
+        fill_rate, _, _ = compute_fill_rate_from_points(
+            points_by_bin.get(bin_id, [])
         )
 
         # Logic: How many hours until 100%?
@@ -164,39 +363,263 @@ def prepare_features_for_prediction(bins_df):
     return pd.DataFrame(predictions)
 
 
-def update_predictions_in_firebase(predictions_df):
-    """Push results to Firebase"""
-    print("Updating predictions in Firebase...")
-    ref = db.reference("/predictions")
+def predict_time_to_full_batch(bins_df, history_df, current_time):
+    """Batched fill-rate heuristic over the whole fleet"""
+    bin_ids = bins_df["bin_id"].to_numpy()
+    current_fill = bins_df["fill_level"].to_numpy(dtype=np.float64)
+
+    fill_rate = compute_fill_rates_batch(history_df, bin_ids)
+    time_to_full = compute_time_to_full_batch(current_fill, fill_rate)
 
-    updates = {}
-    for _, row in predictions_df.iterrows():
-        updates[row["bin_id"]] = {
-            "fill_level": row["fill_level"],
-            "fill_rate": row["fill_rate"],
-            "time_to_full_h": row["time_to_full_h"],
-            "predicted_at": row["predicted_at"],
+    return pd.DataFrame(
+        {
+            "bin_id": bin_ids,
+            "fill_level": current_fill,
+            "fill_rate": round_like_python(fill_rate, 2),
+            "time_to_full_h": round_like_python(time_to_full, 1),
+            "predicted_at": current_time,
         }
+    )
+
+
+def load_model(model_path=MODEL_PATH, mmap_mode=MODEL_MMAP_MODE):
+    """
+    Load the trained model once per process and keep it resident.
+    Returns (model, feature_cols, load_seconds); load_seconds is 0 once cached.
+    """
+    with _model_lock:
+        if _model_cache["model"] is not None:
+            return _model_cache["model"], _model_cache["feature_cols"], 0.0
+
+        print(f"Loading model from {model_path} (mmap_mode={mmap_mode})...")
+        start = time.perf_counter()
+        model = joblib.load(model_path, mmap_mode=mmap_mode)
+
+        metadata_path = model_path.replace(".joblib", "_metadata.json")
+        with open(metadata_path) as f:
+            feature_cols = json.load(f)["feature_columns"]
+
+        load_seconds = time.perf_counter() - start
+        _model_cache["model"] = model
+        _model_cache["feature_cols"] = feature_cols
+        print(f"Model loaded in {load_seconds * 1000:.1f} ms")
+
+        return model, feature_cols, load_seconds
+
+
+def predict_time_to_full_model(bins_df, history_df, current_time):
+    """
+    Predict time to full with the trained model.
+    Builds the full feature matrix for the fleet in one pass and calls
+    model.predict once per MODEL_BATCH_SIZE rows.
+    """
+    model, feature_cols, load_seconds = load_model()
+
+    # Heuristic fill rate is still reported alongside the model output
+    predictions = predict_time_to_full_batch(bins_df, history_df, current_time)
+
+    features = compute_model_features_batch(bins_df, history_df, current_time)
+    X = features[feature_cols].replace([np.inf, -np.inf], 0).fillna(0)
 
-    ref.update(updates)
-    print("Predictions updated successfully.")
+    start = time.perf_counter()
+    batches = [
+        model.predict(X.iloc[i : i + MODEL_BATCH_SIZE])
+        for i in range(0, len(X), MODEL_BATCH_SIZE)
+    ]
+    predict_seconds = time.perf_counter() - start
+
+    time_to_full = np.clip(np.concatenate(batches), 0, None)
+    time_to_full[features["fill_level"].to_numpy() >= 100] = 0.0
+
+    predictions["time_to_full_h"] = round_like_python(time_to_full, 1)
+    predictions["predictor"] = "model"
+    predictions["model_load_ms"] = round(load_seconds * 1000, 1)
+    predictions["predict_ms"] = round(predict_seconds * 1000, 1)
+    return predictions
+
+
+def prepare_features_for_prediction(bins_df, history_df=None, predictor=PREDICTOR):
+    """Calculate fill rate and time to full for every bin"""
+    print(f"Preparing features for prediction (predictor={predictor})...")
+    current_time = time.time()
+
+    # Fetch every bin's recent window in one bulk pass
+    if history_df is None:
+        history_df = fetch_bin_histories(bins_df["bin_id"])
+
+    if predictor == "model":
+        try:
+            predictions = predict_time_to_full_model(bins_df, history_df, current_time)
+            print(
+                f"Model predicted {len(predictions)} bins in "
+                f"{predictions['predict_ms'].iloc[0]:.1f} ms"
+            )
+            return predictions
+        except Exception as e:
+            print(f"Model predictor unavailable ({e}). Falling back to heuristic.")
+
+    # Fast heuristic path (also the fallback when the model cannot be used)
+    start = time.perf_counter()
+    predictions = predict_time_to_full_batch(bins_df, history_df, current_time)
+    predictions["predictor"] = "heuristic"
+    predictions["model_load_ms"] = 0.0
+    predictions["predict_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return predictions
+
+
+def load_published_snapshot(path):
+    """Load the last published predictions (bin_id -> fields) from disk"""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_published_snapshot(snapshot, path):
+    """Persist the published snapshot atomically"""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def compute_prediction_updates(predictions_df, snapshot, now=None):
+    """
+    Compare predictions against the last published snapshot.
+    Returns a multi-path update dict for /predictions. Changed bins
+    get "bin_id/field" paths for the fields that moved beyond
+    PREDICTION_TOLERANCES plus the prediction metadata. New bins and bins not
+    refreshed for PREDICTION_REFRESH_SECONDS are sent whole as "bin_id".
+    """
+    now = time.time() if now is None else now
+    fields = [c for c in PREDICTION_FIELDS if c in predictions_df]
+    current = predictions_df.set_index("bin_id")[fields]
+
+    previous = pd.DataFrame.from_dict(snapshot, orient="index")
+    previous = previous.reindex(index=current.index, columns=fields + ["published_at"])
+
+    # Whole-bin uploads: never published, or due for a periodic refresh
+    published_at = pd.to_numeric(previous["published_at"], errors="coerce")
+    send_all = published_at.isna() | (now - published_at >= PREDICTION_REFRESH_SECONDS)
+
+    moved = pd.DataFrame(False, index=current.index, columns=fields)
+    for field, tolerance in PREDICTION_TOLERANCES.items():
+        if field in fields:
+            delta = (current[field] - pd.to_numeric(previous[field])).abs()
+            moved[field] = delta.isna() | (delta > tolerance)
+
+    changed = send_all | moved.any(axis=1)
+    metadata = [c for c in fields if c not in PREDICTION_TOLERANCES]
+    moved.loc[changed, metadata] = True
+    moved.loc[send_all, :] = True
+
+    # tolist() / to_dict() yield plain Python values that Firebase can serialize
+    updates = current[send_all].to_dict("index")
+    partial = changed & ~send_all
+    for field in fields:
+        mask = partial & moved[field]
+        for bin_id, value in zip(current.index[mask], current.loc[mask, field].tolist()):
+            updates[f"{bin_id}/{field}"] = value
+
+    return updates
+
+
+def update_predictions_in_firebase(predictions_df, mode=None):
+    """
+    Push results to Firebase.
+    mode="delta" (default) uploads only bins that moved beyond tolerance,
+    mode="full" rewrites every bin. Returns write statistics.
+    """
+    mode = mode or WRITE_MODE
+    print(f"Updating predictions in Firebase (mode={mode})...")
+
+    storage = get_storage()
+    snapshot_path = PUBLISHED_SNAPSHOT_PATH if storage.name == "firebase" else None
+
+    with _published_lock:
+        if _published["storage"] is not storage:
+            _published["storage"] = storage
+            _published["snapshot"] = load_published_snapshot(snapshot_path)
+        snapshot = _published["snapshot"]
+
+        now = time.time()
+        if mode == "full":
+            updates = compute_prediction_updates(predictions_df, {}, now)
+        else:
+            updates = compute_prediction_updates(predictions_df, snapshot, now)
+
+        payload_bytes = 0
+        if updates:
+            payload_bytes = len(json.dumps(updates, separators=(",", ":")).encode())
+            storage.update_predictions(updates)
+            # Keep this process's fleet cache (if running) in step with the write
+            cache = get_fleet_cache()
+            if cache is not None:
+                cache.apply_prediction_updates(updates)
+
+        # Remember exactly what was uploaded for the next comparison
+        keys_written = 0
+        for path, value in updates.items():
+            if "/" in path:
+                bin_id, field = path.split("/", 1)
+                snapshot.setdefault(bin_id, {})[field] = value
+                keys_written += 1
+            else:
+                snapshot[path] = {**value, "published_at": now}
+                keys_written += len(value)
+        if updates:
+            save_published_snapshot(snapshot, snapshot_path)
+
+    bins_written = len({path.split("/", 1)[0] for path in updates})
+    stats = {
+        "mode": mode,
+        "bins": len(predictions_df),
+        "bins_written": bins_written,
+        "keys_written": keys_written,
+        "bytes_written": payload_bytes,
+    }
+    print(
+        f"Predictions updated: {bins_written}/{len(predictions_df)} bins, "
+        f"{keys_written} keys, {payload_bytes / 1024:.1f} KB"
+    )
+    return stats
 
 
 def main():
+    """
+    Run inference for every bin. Returns run statistics with per-stage
+    timings (seconds) for callers such as the API job queue.
+    """
     try:
-        init_firebase()
+        timings = {}
 
         # 1. Get Current Data
+        start = time.perf_counter()
         bins_df = fetch_current_bin_states()
+        timings["fetch_bins"] = time.perf_counter() - start
         if bins_df.empty:
             print("No bins found.")
-            return
+            return {"bins": 0, "timings": timings}
 
-        # 2. Predict logic (Simple Heuristic / Linear Regression)
+        # 2. Predict (trained model or fill-rate heuristic)
+        start = time.perf_counter()
         preds_df = prepare_features_for_prediction(bins_df)
+        timings["predict"] = time.perf_counter() - start
 
         # 3. Save
-        update_predictions_in_firebase(preds_df)
+        start = time.perf_counter()
+        write_stats = update_predictions_in_firebase(preds_df)
+        timings["write"] = time.perf_counter() - start
+
+        return {
+            "bins": len(preds_df),
+            "predictor": str(preds_df["predictor"].iloc[0]),
+            "write": write_stats,
+            "timings": timings,
+        }
 
     except Exception as e:
         print(f"Error during inference: {e}")
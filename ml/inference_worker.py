@@ -0,0 +1,171 @@
+"""
+Inference Worker
+Long-running process that keeps /predictions fresh as sensors report.
+Each bin's recent readings are seeded from /history once; after that the
+worker listens to /bins and only recomputes the bins whose node changed.
+Bursts (live_simulate.py, ESP32 firmware) are debounced into one write.
+"""
+
+import signal
+import threading
+import time
+from collections import deque
+import pandas as pd
+
+import inference
+from storage import get_storage
+
+# Configuration
+DEBOUNCE_SECONDS = 2.0  # Collect changes for this long before predicting
+
+# Global state
+running = True
+state_lock = threading.Lock()
+bin_states = {}  # bin_id -> latest /bins payload
+bin_windows = {}  # bin_id -> deque of (timestamp, fill_level), oldest first
+dirty_bins = {}  # bin_id -> time the first unflushed change arrived
+
+
+def signal_handler(sig, frame):
+    """Handle Ctrl+C gracefully to stop the worker"""
+    global running
+    print("\n\n🛑 Stopping inference worker...")
+    running = False
+
+
+def seed_windows():
+    """Seed every bin's rolling window from /history (one bulk read)"""
+    bins_df = inference.fetch_current_bin_states()
+    if bins_df.empty:
+        return
+
+    history_df = inference.fetch_bin_histories(bins_df["bin_id"])
+    with state_lock:
+        for bin_id, group in history_df.groupby("bin_id", sort=False):
+            bin_windows[bin_id] = deque(
+                zip(group["ts"], group["fill"]), maxlen=inference.HISTORY_LIMIT
+            )
+    print(f"✓ Seeded rolling windows for {len(bin_windows)} bins")
+
+
+def record_reading(bin_id, state):
+    """
+    Store the bin's latest state and push the reading onto its window.
+    O(1): a deque append that evicts the oldest point once the window is full.
+    Must be called with state_lock held.
+    """
+    bin_states[bin_id] = state
+    dirty_bins.setdefault(bin_id, time.time())
+
+    try:
+        fill = float(state.get("fill_level", 0))
+        ts = float(state.get("timestamp", time.time()))
+    except (TypeError, ValueError):
+        return
+
+    window = bin_windows.setdefault(bin_id, deque(maxlen=inference.HISTORY_LIMIT))
+    # Ignore replays and out-of-order readings so the window stays time-ordered
+    if window and ts <= window[-1][0]:
+        return
+    window.append((ts, fill))
+
+
+def handle_bins_event(event):
+    """Apply a /bins change-stream event to the in-memory state"""
+    parts = [p for p in event.path.split("/") if p]
+
+    with state_lock:
+        if not parts:
+            # Full snapshot (initial event or a write to /bins itself)
+            for bin_id, state in (event.data or {}).items():
+                if isinstance(state, dict):
+                    record_reading(bin_id, state)
+            return
+
+        bin_id = parts[0]
+        if len(parts) == 1:
+            if event.data is None:
+                # Bin removed
+                bin_states.pop(bin_id, None)
+                bin_windows.pop(bin_id, None)
+                dirty_bins.pop(bin_id, None)
+                return
+            if event.event_type == "patch":
+                state = {**bin_states.get(bin_id, {}), **event.data}
+            else:
+                state = event.data
+        else:
+            # Single field of one bin changed
+            state = {**bin_states.get(bin_id, {}), parts[1]: event.data}
+
+        record_reading(bin_id, state)
+
+
+def flush_dirty_bins():
+    """Predict and write /predictions entries for bins changed since last flush"""
+    with state_lock:
+        if not dirty_bins:
+            return
+        changed = dict(dirty_bins)
+        dirty_bins.clear()
+
+        bin_ids = [b for b in changed if b in bin_states]
+        now = time.time()
+        bins_df = pd.DataFrame(
+            {
+                "bin_id": bin_ids,
+                "fill_level": [bin_states[b].get("fill_level", 0) for b in bin_ids],
+                "last_updated": [bin_states[b].get("timestamp", now) for b in bin_ids],
+            }
+        )
+        # Bad sensor values become 0 / now instead of failing the whole flush
+        bins_df["fill_level"] = pd.to_numeric(
+            bins_df["fill_level"], errors="coerce"
+        ).fillna(0)
+        bins_df["last_updated"] = pd.to_numeric(
+            bins_df["last_updated"], errors="coerce"
+        ).fillna(now)
+        points = [
+            (b, ts, fill) for b in bin_ids for ts, fill in bin_windows.get(b, ())
+        ]
+
+    if bins_df.empty:
+        return
+
+    history_df = pd.DataFrame(points, columns=["bin_id", "ts", "fill"])
+    preds_df = inference.prepare_features_for_prediction(bins_df, history_df)
+    inference.update_predictions_in_firebase(preds_df)
+
+    now = time.time()
+    latency = max(now - changed[b] for b in bin_ids)
+    print(f"✓ Updated {len(bin_ids)} bins (max change-to-write latency {latency:.2f}s)")
+
+
+def main():
+    """Main worker loop"""
+    global running
+
+    signal.signal(signal.SIGINT, signal_handler)
+
+    try:
+        print("\n🧠 Starting inference worker...")
+        storage = get_storage()
+        seed_windows()
+
+        registration = storage.listen_bins(handle_bins_event)
+        print(f"✓ Listening to /bins (debounce {DEBOUNCE_SECONDS}s)")
+
+        while running:
+            time.sleep(DEBOUNCE_SECONDS)
+            flush_dirty_bins()
+
+        registration.close()
+        print("\n✓ Inference worker stopped gracefully.")
+
+    except Exception as e:
+        print(f"\n❌ Inference worker error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
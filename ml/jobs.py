@@ -0,0 +1,160 @@
+"""
+Job Queue
+Runs long API tasks (inference, routing) in the background so requests
+return immediately with a job id.
+
+- Bounded: a fixed thread pool, and at most JOB_QUEUE_LIMIT jobs queued or
+  running at once
+- Single-flight: submitting work whose key is already queued or running
+  returns the existing job instead of starting a duplicate
+- Finished jobs are kept (up to JOB_HISTORY_LIMIT) for GET /jobs/<id>
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Configuration
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_QUEUE_LIMIT = 16  # Queued + running jobs
+JOB_HISTORY_LIMIT = 200  # Finished jobs kept for status lookups
+
+
+class QueueFullError(Exception):
+    """Raised when JOB_QUEUE_LIMIT jobs are already queued or running"""
+
+
+class Job:
+    """One unit of background work and its outcome"""
+
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self):
+        """JSON-serializable status, with queue/run time and stage timings"""
+        now = time.time()
+        timings = {"queued": (self.started_at or now) - self.created_at}
+        if self.started_at is not None:
+            timings["run"] = (self.finished_at or now) - self.started_at
+        if isinstance(self.result, dict):
+            timings.update(self.result.get("timings") or {})
+
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": {name: round(seconds, 3) for name, seconds in timings.items()},
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Bounded thread pool with single-flight job submission"""
+
+    def __init__(
+        self,
+        max_workers=JOB_WORKERS,
+        queue_limit=JOB_QUEUE_LIMIT,
+        history_limit=JOB_HISTORY_LIMIT,
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self.queue_limit = queue_limit
+        self.history_limit = history_limit
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()  # job_id -> Job, oldest first
+        self.in_flight = {}  # key -> queued or running Job
+
+    def submit(self, kind, fn, key=None):
+        """
+        Queue fn() as a job. Returns (job, created); created is False when
+        an identical job (same key, default kind) was already in flight.
+        """
+        key = key or kind
+        with self.lock:
+            job = self.in_flight.get(key)
+            if job is not None:
+                return job, False
+            if len(self.in_flight) >= self.queue_limit:
+                raise QueueFullError(f"{len(self.in_flight)} jobs already queued")
+
+            job = Job(kind, key)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            self._trim_history()
+
+        self.executor.submit(self._run, job, fn)
+        return job, True
+
+    def _run(self, job, fn):
+        with self.lock:
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            result = fn()
+            with self.lock:
+                job.result = result
+                job.status = "succeeded"
+        except Exception:
+            traceback.print_exc()
+            with self.lock:
+                job.error = "An internal error has occurred."
+                job.status = "failed"
+        finally:
+            with self.lock:
+                job.finished_at = time.time()
+                if self.in_flight.get(job.key) is job:
+                    del self.in_flight[job.key]
+
+    def _trim_history(self):
+        """Forget the oldest finished jobs beyond history_limit"""
+        excess = len(self.jobs) - self.history_limit
+        for job_id in list(self.jobs):
+            if excess <= 0:
+                break
+            if self.jobs[job_id].done:
+                del self.jobs[job_id]
+                excess -= 1
+
+    def get(self, job_id):
+        """Status dict for a job, or None if unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide job manager, creating it on first use"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -9,11 +9,10 @@ import sys
 import time
 import random
 import signal
-import numpy as np
-import firebase_admin
-from firebase_admin import credentials, db
 from datetime import datetime
 
+from storage import get_storage
+
 # --- Configuration ---
 NUM_BINS = 26  # Matches your physical bin count + virtual ones
 UPDATE_INTERVAL = 1.0  # Seconds between sensor readings
@@ -42,17 +41,6 @@ def signal_handler(sig, frame):
     print("\n\n🛑 Stopping simulation...")
     running = False
 
-def init_firebase():
-    """Initialize Firebase Admin SDK"""
-    if not firebase_admin._apps:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(
-            cred,
-            {
-                "databaseURL": "https://smart-waste-3d7d0-default-rtdb.europe-west1.firebasedatabase.app/"
-            },
-        )
-
 def generate_bins(num_bins):
     """Generate initial bin states with random locations and types"""
     bins = []
@@ -129,21 +117,20 @@ def write_to_firebase(bin_state, write_history=True):
     bin_id = bin_state["bin_id"]
     timestamp = int(time.time())
 
+    storage = get_storage()
+
     # Update Live State
-    bins_ref = db.reference(f"/bins/{bin_id}")
     current_data = {
         "fill_level": round(bin_state["fill_level"], 2),
         "latitude": round(bin_state["latitude"], 6),
         "longitude": round(bin_state["longitude"], 6),
         "timestamp": timestamp,
     }
-    bins_ref.set(current_data)
+    storage.set_bin(bin_id, current_data)
 
     # Record History (for ML Training)
     if write_history:
-        day_key = str(datetime.now().day)
-        history_ref = db.reference(f"/history/{day_key}/{bin_id}/{timestamp}")
-        history_ref.set(current_data)
+        storage.add_history(bin_id, timestamp, current_data)
 
 def print_status(bins_state, collections_this_round):
     """Display a professional dashboard in the terminal"""
@@ -197,8 +184,8 @@ def main():
 
     try:
         print("\n🚀 Initializing Simulation Environment...")
-        init_firebase()
-        print("✓ Firebase Connected")
+        storage = get_storage()
+        print(f"✓ Connected to {storage.name} storage")
 
         bins_state = generate_bins(NUM_BINS)
         print(f"✓ {NUM_BINS} Virtual Nodes Generated")
@@ -0,0 +1,85 @@
+"""
+Pipeline Module
+Runs inference and route optimization in one process.
+
+Predictions and bin coordinates are handed from inference to routing as
+DataFrames instead of round-tripping through /predictions and /bins:
+/bins and the history windows are read once, and /predictions and /routes
+are written once at the end.
+
+Usage:
+  python pipeline.py [single|cluster|fleet|prize]
+"""
+
+import sys
+import time
+import pandas as pd
+
+import inference
+import routing
+
+
+def run_pipeline(mode=None):
+    """
+    Inference followed by routing, persisting both outputs at the end.
+    Returns run statistics with per-stage timings (seconds).
+    """
+    mode = mode or routing.ROUTING_MODE
+    stats = {"mode": mode, "bins": 0, "routes": {}, "timings": {}}
+    timings = stats["timings"]
+    start_time = time.time()
+
+    # 1. Current bin states (fill levels and coordinates, one bulk read)
+    start = time.perf_counter()
+    bins_df = inference.fetch_current_bin_states()
+    timings["fetch_bins"] = time.perf_counter() - start
+    if bins_df.empty:
+        print("No bins found.")
+        return stats
+
+    # Routing resolves coordinates from this frame instead of re-reading /bins
+    locations_df = bins_df[["bin_id", "latitude", "longitude"]].copy()
+    locations_df[["latitude", "longitude"]] = locations_df[
+        ["latitude", "longitude"]
+    ].apply(pd.to_numeric, errors="coerce").fillna(0)
+    routing.register_bin_locations(locations_df)
+
+    # 2. Predict
+    start = time.perf_counter()
+    preds_df = inference.prepare_features_for_prediction(bins_df)
+    timings["predict"] = time.perf_counter() - start
+    stats["bins"] = len(preds_df)
+
+    # 3. Route straight from the in-memory predictions; intermediate
+    # (anytime) routes are not published so outputs are written once
+    start = time.perf_counter()
+    predictions_df = preds_df[["bin_id", "time_to_full_h", "fill_level"]]
+    routes = routing.optimize_routes(predictions_df, mode, anytime=False)
+    timings["solve"] = time.perf_counter() - start
+
+    # 4. Persist predictions and routes
+    start = time.perf_counter()
+    stats["write"] = inference.update_predictions_in_firebase(preds_df)
+    if routes:
+        routing.save_routes_to_firebase(routes)
+        stats["routes"] = routing.summarize_routes(routes)
+    elif routes is not None:
+        print("Failed to find optimal route")
+    timings["save"] = time.perf_counter() - start
+
+    elapsed = time.time() - start_time
+    print(f"\n✓ Pipeline completed in {elapsed:.2f} seconds")
+    return stats
+
+
+def main():
+    try:
+        mode = sys.argv[1] if len(sys.argv) > 1 else None
+        return run_pipeline(mode)
+    except Exception as e:
+        print(f"Error during pipeline run: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,23 @@ and writes route back to Firebase.
 
 import numpy as np
 import pandas as pd
-import firebase_admin
-from firebase_admin import credentials, db
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
+import io
+import os
+import re
 import time
 import json
-from math import radians, cos, sin, asin, sqrt
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+
+from distance_cache import DistanceCache
+from file_lock import file_lock
+from geo import haversine_distance, haversine_matrix, haversine_pairs, project_to_plane
+from fleet_cache import get_reader
+from spatial_index import SpatialIndex
+from storage import get_storage
 
 # Depot location (example - replace with your actual depot coordinates)
 DEPOT_LAT = 33.5731
@@ -25,45 +35,122 @@ TIME_THRESHOLD = 12
 # Maximum number of bins to visit in one route
 MAX_BINS_PER_ROUTE = 30
 
-
-def init_firebase():
-    """Initialize Firebase Admin SDK"""
-    if not firebase_admin._apps:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(
-            cred,
-            {
-                "databaseURL": "https://smart-waste-3d7d0-default-rtdb.europe-west1.firebasedatabase.app/"
-            },
-        )
-
-
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculate the great circle distance between two points
-    on the earth (specified in decimal degrees).
-    Returns distance in kilometers.
-    """
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-
-    # Radius of earth in kilometers
-    r = 6371
-
-    return c * r
+# Routing mode: "single" routes at most MAX_BINS_PER_ROUTE bins with one
+# truck; "cluster" routes every urgent bin, split spatially into one route
+# (/routes/route_k) per cluster solved in parallel processes; "fleet" solves
+# one capacitated VRP with a route per truck (see FLEET_* below); "prize"
+# lets the solver pick which nearby bins are worth the detour (PRIZE_*)
+ROUTING_MODE = os.environ.get("ROUTING_MODE", "single")
+
+# Cluster mode: bins per cluster, partitioning method (sweep or kmeans) and
+# solver processes (all cores by default)
+CLUSTER_SIZE = MAX_BINS_PER_ROUTE
+CLUSTER_METHOD = os.environ.get("ROUTING_CLUSTER_METHOD", "sweep")
+ROUTING_WORKERS = int(os.environ.get("ROUTING_WORKERS", os.cpu_count() or 1))
+
+# Fleet mode ("fleet"): one capacitated VRP over every urgent bin. Capacity
+# is in fill-percent units (a bin at 80% loads 80); FLEET_CAPACITY may list
+# one value per truck ("2000,2000,1500"). Shift time is travel at
+# FLEET_SPEED_KMH plus FLEET_SERVICE_MINUTES per collected bin
+FLEET_VEHICLES = int(os.environ.get("FLEET_VEHICLES", 3))
+FLEET_CAPACITY = os.environ.get("FLEET_CAPACITY", "2000")
+FLEET_SHIFT_HOURS = float(os.environ.get("FLEET_SHIFT_HOURS", 8))
+FLEET_SPEED_KMH = 30
+FLEET_SERVICE_MINUTES = 3
+
+# Cost of leaving a bin unserved; larger than any route so bins are only
+# dropped when capacity or shift time leaves no other choice
+UNSERVED_BIN_PENALTY = 10_000_000
+
+# Prize-collecting mode ("prize"): the solver chooses which bins to visit.
+# Candidates are the urgent bins plus bins filling up within
+# PRIZE_HORIZON_HOURS that lie within PRIZE_NEIGHBOR_KM of an urgent bin.
+# Urgent bins (<= TIME_THRESHOLD) cost UNSERVED_BIN_PENALTY to skip; other
+# bins cost their depot round trip scaled by urgency (at least
+# PRIZE_MIN_PENALTY_M). The route still visits at most MAX_BINS_PER_ROUTE bins
+PRIZE_HORIZON_HOURS = 48
+PRIZE_NEIGHBOR_KM = 1.0
+PRIZE_MAX_CANDIDATES = 300
+PRIZE_MIN_PENALTY_M = 500
+
+# Sparse arcs: on instances with more than KNN_MIN_LOCATIONS locations only
+# the spatial index's kNN arcs (KNN_NEIGHBORS per bin, either direction) and
+# the depot arcs are computed and passed to the solver, instead of an n x n
+# matrix; a bin may only be followed by one of those neighbours or a route end.
+# Up to DENSE_MATRIX_MAX_MB of arc costs (the int64 matrix plus the Python
+# lists OR-Tools copies it from, about DENSE_MATRIX_BYTES_PER_ARC per entry;
+# ~1900 locations at 128 MB) the kNN arcs are still registered as a native
+# transit matrix with every other arc priced out, so the search never calls
+# back into Python; only larger instances use per-arc callbacks
+KNN_NEIGHBORS = int(os.environ.get("ROUTING_KNN_NEIGHBORS", 15))
+KNN_MIN_LOCATIONS = 100
+DENSE_MATRIX_MAX_MB = float(os.environ.get("ROUTING_DENSE_MATRIX_MAX_MB", 128))
+DENSE_MATRIX_BYTES_PER_ARC = 36
+
+# Search strategy: (first solution strategy, local search metaheuristic)
+DEFAULT_STRATEGY = ("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH")
+
+# Portfolio: with ROUTING_PORTFOLIO=1 the single-truck TSP runs every
+# strategy below from scratch in its own process, plus the warm start from
+# the previous route (if any) as one more entry, and keeps the cheapest
+# route. Strategies that queue for a worker run in rounds that split the
+# caller's budget, so the wall time stays within it. Wins per instance size are kept in
+# PORTFOLIO_STATS_PATH to pick a default strategy per size later; tied
+# strategies share the win
+USE_PORTFOLIO = os.environ.get("ROUTING_PORTFOLIO", "0") == "1"
+PORTFOLIO_STRATEGIES = [
+    ("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH"),
+    ("SAVINGS", "GUIDED_LOCAL_SEARCH"),
+    ("CHRISTOFIDES", "TABU_SEARCH"),
+    ("PATH_CHEAPEST_ARC", "SIMULATED_ANNEALING"),
+]
+PORTFOLIO_STATS_PATH = "data/solver_portfolio_stats.json"
+PORTFOLIO_SIZE_BUCKETS = (10, 30, 100, 300)  # Upper bounds on bins routed
+
+# Anytime routing (opt-in, ROUTING_ANYTIME=1 or anytime=True): while the
+# single-truck search runs, publish the first feasible route right away and
+# better ones at most every ANYTIME_PUBLISH_INTERVAL seconds, tagged with
+# "version" and "is_final"
+USE_ANYTIME = os.environ.get("ROUTING_ANYTIME", "0") == "1"
+ANYTIME_PUBLISH_INTERVAL = 2.0
+
+# Solver budget: SOLVER_SECONDS_PER_LOCATION per location, clamped to
+# [SOLVER_MIN_SECONDS, SOLVER_MAX_SECONDS]; the search also stops early
+# once no better route was found for SOLVER_NO_IMPROVEMENT_SECONDS
+SOLVER_MIN_SECONDS = 2
+SOLVER_MAX_SECONDS = 30
+SOLVER_SECONDS_PER_LOCATION = 0.2
+SOLVER_NO_IMPROVEMENT_SECONDS = 3
+
+# Seed the search from the previous route when at least this share of the
+# selected bins was on it
+WARM_START_MIN_OVERLAP = 0.5
+
+# Rows/columns per block when building large distance matrices
+DISTANCE_TILE_SIZE = 256
+
+# Bin coordinates are static, so they are cached in a process-wide registry
+# refreshed with one bulk /bins read when stale or missing a bin
+BIN_LOCATION_TTL = 3600  # seconds
+
+_bin_locations = {"frame": None, "loaded_at": 0.0}
+_bin_locations_lock = threading.Lock()
+
+# KD-tree over the registry, rebuilt whenever the registry frame changes
+_bin_index = {"frame": None, "index": None}
+
+# Distances between static bins are kept in an on-disk cache across runs;
+# set ROUTING_DISTANCE_CACHE=0 to always build the matrix from scratch
+USE_DISTANCE_CACHE = os.environ.get("ROUTING_DISTANCE_CACHE", "1") != "0"
+
+_distance_cache = None
+_distance_cache_lock = threading.Lock()
 
 
 def fetch_predictions():
     """Fetch all predictions from Firebase"""
-    print("Fetching predictions from Firebase...")
-    ref = db.reference("/predictions")
-    predictions = ref.get()
+    print("Fetching predictions...")
+    predictions = get_reader().get_predictions()
 
     if not predictions:
         print("No predictions found")
@@ -85,25 +172,90 @@ def fetch_predictions():
     return df
 
 
+def bins_to_locations(bins):
+    """Convert a {bin_id: state} mapping into a bin_id-indexed coordinate frame"""
+    bins = {k: v for k, v in (bins or {}).items() if isinstance(v, dict)}
+    frame = pd.DataFrame.from_dict(bins, orient="index")
+    frame = frame.reindex(columns=["latitude", "longitude"])
+    frame = frame.apply(pd.to_numeric, errors="coerce").fillna(0)
+    frame.index.name = "bin_id"
+    return frame
+
+
+def register_bin_locations(locations_df):
+    """Add coordinates already read elsewhere (bin_id, latitude, longitude) to the registry"""
+    frame = locations_df.set_index("bin_id")[["latitude", "longitude"]]
+    with _bin_locations_lock:
+        registry = _bin_locations["frame"]
+        if registry is not None:
+            frame = frame.combine_first(registry)
+        if registry is None or not frame.equals(registry):
+            # New or moved bins: the spatial index is rebuilt on next use
+            _bin_locations["frame"] = frame
+            _bin_index["frame"] = _bin_index["index"] = None
+        _bin_locations["loaded_at"] = time.time()
+
+
 def fetch_bin_locations(bin_ids):
-    """Fetch location data for specific bins"""
+    """
+    Fetch location data for specific bins.
+    Served from the bin-location registry; a single bulk /bins read refreshes
+    it when it is stale or does not know one of the bins.
+    """
     print(f"Fetching locations for {len(bin_ids)} bins...")
-    locations = []
+    start = time.perf_counter()
+    requests = 0
+
+    with _bin_locations_lock:
+        registry = _bin_locations["frame"]
+        stale = (
+            registry is None
+            or time.time() - _bin_locations["loaded_at"] > BIN_LOCATION_TTL
+            or not pd.Index(bin_ids).isin(registry.index).all()
+        )
+        if stale:
+            registry = bins_to_locations(get_reader().get_bins())
+            requests = 1
+            _bin_locations["frame"] = registry
+            _bin_locations["loaded_at"] = time.time()
+
+    # Vectorized join keeps the caller's bin order; unknown bins are dropped
+    locations_df = pd.DataFrame({"bin_id": list(bin_ids)}).merge(
+        registry, left_on="bin_id", right_index=True, how="inner"
+    )
+    locations_df = locations_df.reset_index(drop=True)
 
-    ref = db.reference("/bins")
+    elapsed = time.perf_counter() - start
+    print(
+        f"Resolved {len(locations_df)}/{len(bin_ids)} locations with "
+        f"{requests} request(s) in {elapsed * 1000:.1f} ms"
+    )
+
+    return locations_df
 
-    for bin_id in bin_ids:
-        bin_data = ref.child(bin_id).get()
-        if bin_data:
-            locations.append(
-                {
-                    "bin_id": bin_id,
-                    "latitude": bin_data.get("latitude", 0),
-                    "longitude": bin_data.get("longitude", 0),
-                }
-            )
 
-    return pd.DataFrame(locations)
+def get_bin_index():
+    """
+    Spatial index over every known bin. Built from the bin-location registry
+    (one bulk /bins read when empty or stale) and rebuilt only when the
+    registry changes.
+    """
+    with _bin_locations_lock:
+        registry = _bin_locations["frame"]
+        if (
+            registry is None
+            or time.time() - _bin_locations["loaded_at"] > BIN_LOCATION_TTL
+        ):
+            registry = bins_to_locations(get_reader().get_bins())
+            _bin_locations["frame"] = registry
+            _bin_locations["loaded_at"] = time.time()
+
+        if _bin_index["frame"] is not registry:
+            _bin_index["index"] = SpatialIndex(
+                registry.reset_index(), origin=(DEPOT_LAT, DEPOT_LON)
+            )
+            _bin_index["frame"] = registry
+        return _bin_index["index"]
 
 
 def select_bins_for_collection(
@@ -111,7 +263,7 @@ def select_bins_for_collection(
 ):
     """
     Select bins that need collection based on time_to_full prediction.
-    Prioritizes most urgent bins.
+    Prioritizes most urgent bins. max_bins=None keeps every urgent bin.
     """
     print(f"\nSelecting bins with time_to_full <= {threshold} hours...")
 
@@ -120,11 +272,12 @@ def select_bins_for_collection(
 
     if len(urgent_bins) == 0:
         # If no urgent bins, select top N bins with shortest time to full
+        fallback = max_bins or MAX_BINS_PER_ROUTE
         print(
-            f"No urgent bins found. Selecting {max_bins} bins with shortest time to full..."
+            f"No urgent bins found. Selecting {fallback} bins with shortest time to full..."
         )
-        urgent_bins = predictions_df.nsmallest(max_bins, "time_to_full_h").copy()
-    elif len(urgent_bins) > max_bins:
+        urgent_bins = predictions_df.nsmallest(fallback, "time_to_full_h").copy()
+    elif max_bins is not None and len(urgent_bins) > max_bins:
         # If too many urgent bins, select the most urgent ones
         print(
             f"Found {len(urgent_bins)} urgent bins. Selecting {max_bins} most urgent..."
@@ -143,51 +296,475 @@ def select_bins_for_collection(
     return urgent_bins
 
 
-def create_distance_matrix(locations_df):
+def create_distance_matrix(locations_df, dtype=np.int64, tile_size=DISTANCE_TILE_SIZE):
     """
     Create distance matrix using Haversine formula.
     First location is depot, remaining are bins.
-    Returns distance matrix in meters.
+    Returns distance matrix in meters (truncated to `dtype`, e.g. np.int32).
+
+    Distances are symmetric, so only upper-triangle blocks are computed and
+    mirrored. Working in tile_size x tile_size blocks keeps temporary memory
+    bounded regardless of n.
     """
     print("\nCreating distance matrix...")
 
     # Prepare coordinates: depot first, then bins
-    coords = [(DEPOT_LAT, DEPOT_LON)]
-    for idx, row in locations_df.iterrows():
-        coords.append((row["latitude"], row["longitude"]))
-
-    n = len(coords)
-    distance_matrix = np.zeros((n, n))
-
-    # Calculate distances between all pairs
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                lat1, lon1 = coords[i]
-                lat2, lon2 = coords[j]
-                # Convert km to meters
-                distance_matrix[i][j] = (
-                    haversine_distance(lat1, lon1, lat2, lon2) * 1000
-                )
+    lat = np.concatenate(
+        [[DEPOT_LAT], locations_df["latitude"].to_numpy(dtype=np.float64)]
+    )
+    lon = np.concatenate(
+        [[DEPOT_LON], locations_df["longitude"].to_numpy(dtype=np.float64)]
+    )
+
+    n = len(lat)
+    distance_matrix = np.zeros((n, n), dtype=dtype)
+
+    for i0 in range(0, n, tile_size):
+        i1 = min(i0 + tile_size, n)
+        for j0 in range(i0, n, tile_size):
+            j1 = min(j0 + tile_size, n)
+            # Convert km to meters
+            block = (
+                haversine_matrix(lat[i0:i1], lon[i0:i1], lat[j0:j1], lon[j0:j1])
+                * 1000
+            ).astype(dtype)
+            distance_matrix[i0:i1, j0:j1] = block
+            distance_matrix[j0:j1, i0:i1] = block.T
 
     print(f"Distance matrix created: {n}x{n} locations")
 
-    return distance_matrix.astype(int)
+    return distance_matrix
+
+
+def get_distance_cache():
+    """Return the process-wide distance cache, opening it on first use"""
+    global _distance_cache
+    with _distance_cache_lock:
+        if _distance_cache is None:
+            _distance_cache = DistanceCache()
+        return _distance_cache
+
+
+def get_distance_matrix(locations_df):
+    """
+    Distance matrix for depot + locations_df, served from the persistent
+    cache (only new or moved bins are computed) unless it is disabled.
+    """
+    if not USE_DISTANCE_CACHE:
+        return create_distance_matrix(locations_df)
+
+    print("\nLoading distance matrix from cache...")
+    distance_matrix = get_distance_cache().submatrix(
+        locations_df["bin_id"].tolist(),
+        locations_df["latitude"].to_numpy(dtype=np.float64),
+        locations_df["longitude"].to_numpy(dtype=np.float64),
+        (DEPOT_LAT, DEPOT_LON),
+    )
+    n = len(distance_matrix)
+    print(f"Distance matrix created: {n}x{n} locations")
+
+    # Same dtype as create_distance_matrix
+    return distance_matrix.astype(np.int64)
+
 
+class SparseDistances:
+    """
+    Arc lengths (meters) for depot + locations_df on large instances. Only
+    each location's k nearest neighbours (both directions, from a spatial
+    index over the instance), the arcs to and from the depot and the arcs of
+    a nearest-neighbour seed route are computed, so building and holding it
+    is O(n k) instead of O(n^2). The seed route guarantees that a tour exists
+    within the graph. Node 0 is the depot, as in the dense matrix.
+    """
+
+    def __init__(self, locations_df, k=KNN_NEIGHBORS):
+        self.latitudes = np.concatenate(
+            [[DEPOT_LAT], locations_df["latitude"].to_numpy(dtype=np.float64)]
+        )
+        self.longitudes = np.concatenate(
+            [[DEPOT_LON], locations_df["longitude"].to_numpy(dtype=np.float64)]
+        )
+        self.coordinates = list(zip(self.latitudes.tolist(), self.longitudes.tolist()))
+        self.k = k
+        n = len(self.latitudes)
+
+        index = SpatialIndex(
+            pd.DataFrame(
+                {
+                    "bin_id": np.arange(n),
+                    "latitude": self.latitudes,
+                    "longitude": self.longitudes,
+                }
+            ),
+            origin=(DEPOT_LAT, DEPOT_LON),
+        )
+        from_nodes, to_nodes = index.neighbor_arcs(k)
+        self.seed_route = self.nearest_neighbor_route(index)
+        # Every bin can be reached from and return to the depot
+        bins = np.arange(1, n)
+        seed = np.asarray(self.seed_route, dtype=np.int64)
+        from_nodes = np.concatenate(
+            [from_nodes, np.zeros_like(bins), bins, seed[:-1], seed[1:]]
+        )
+        to_nodes = np.concatenate(
+            [to_nodes, bins, np.zeros_like(bins), seed[1:], seed[:-1]]
+        )
+        keys = np.unique(from_nodes * n + to_nodes)
+
+        from_nodes, to_nodes = keys // n, keys % n
+        meters = self.arc_lengths(from_nodes, to_nodes)
+        self.costs = dict(zip(keys.tolist(), meters.tolist()))
+        # Allowed successors per node (keys are sorted by from-node)
+        self.successors = np.split(
+            to_nodes, np.searchsorted(from_nodes, np.arange(1, n))
+        )
+        self._dense = None
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    @property
+    def num_arcs(self):
+        return len(self.costs)
+
+    @property
+    def native(self):
+        """Small enough to register as a dense transit matrix"""
+        return len(self) <= dense_matrix_max_locations()
+
+    def dense(self):
+        """
+        n x n matrix of the kNN arcs, every other arc priced at
+        UNSERVED_BIN_PENALTY (restrict_arcs forbids them anyway)
+        """
+        if self._dense is None:
+            n = len(self)
+            matrix = np.full((n, n), UNSERVED_BIN_PENALTY, dtype=np.int64)
+            # Arc keys are from * n + to, i.e. flat matrix positions
+            keys = np.fromiter(self.costs.keys(), dtype=np.int64, count=len(self.costs))
+            matrix.flat[keys] = np.fromiter(
+                self.costs.values(), dtype=np.int64, count=len(self.costs)
+            )
+            np.fill_diagonal(matrix, 0)
+            self._dense = matrix
+        return self._dense
+
+    @staticmethod
+    def nearest_neighbor_route(index):
+        """
+        Bin nodes in greedy nearest-neighbour order from the depot (node 0),
+        each step a KD-tree query widened until an unvisited bin turns up
+        """
+        n = len(index)
+        visited = np.zeros(n, dtype=bool)
+        visited[0] = True
+        route, node = [], 0
+        for _ in range(n - 1):
+            k = 8
+            while True:
+                k = min(k, n)
+                _, positions = index.tree.query(index.points[node], k=k)
+                positions = np.atleast_1d(positions)
+                unvisited = positions[~visited[positions]]
+                if len(unvisited) or k == n:
+                    break
+                k *= 4
+            node = int(unvisited[0])
+            visited[node] = True
+            route.append(node)
+        return route
+
+    def arc_lengths(self, from_nodes, to_nodes):
+        """Meters between node pairs, truncated like create_distance_matrix"""
+        km = haversine_pairs(
+            self.latitudes[from_nodes],
+            self.longitudes[from_nodes],
+            self.latitudes[to_nodes],
+            self.longitudes[to_nodes],
+        )
+        return (km * 1000).astype(np.int64)
+
+    def cost(self, from_node, to_node):
+        """Arc length in meters; arcs outside the kNN graph are computed on demand"""
+        if from_node == to_node:
+            return 0
+        meters = self.costs.get(from_node * len(self) + to_node)
+        if meters is None:
+            # Scalar math: the search may probe many arcs outside the graph
+            start, end = self.coordinates[from_node], self.coordinates[to_node]
+            meters = int(haversine_distance(*start, *end) * 1000)
+        return meters
+
+
+def dense_matrix_max_locations(max_mb=DENSE_MATRIX_MAX_MB):
+    """Largest instance whose arc costs fit in max_mb as a native matrix"""
+    return int((max_mb * 2**20 / DENSE_MATRIX_BYTES_PER_ARC) ** 0.5)
 
-def create_data_model(distance_matrix, num_bins):
-    """Create data model for OR-Tools solver"""
+
+def get_arc_costs(locations_df, k=KNN_NEIGHBORS):
+    """
+    Solver arc costs for depot + locations_df: the (cached) dense matrix on
+    small instances, SparseDistances above KNN_MIN_LOCATIONS locations.
+    """
+    num_locations = len(locations_df) + 1
+    if num_locations <= max(KNN_MIN_LOCATIONS, k + 1):
+        return get_distance_matrix(locations_df)
+
+    print(f"\nComputing kNN arcs for {num_locations} locations...")
+    distances = SparseDistances(locations_df, k)
+    print(
+        f"Sparse arcs created: {distances.num_arcs} arcs "
+        f"({k} nearest neighbours per bin + depot arcs)"
+    )
+    return distances
+
+
+def get_fleet():
+    """Fleet definition from the FLEET_* settings"""
+    capacities = [int(c) for c in str(FLEET_CAPACITY).split(",") if c.strip()]
+    if len(capacities) == 1:
+        capacities *= FLEET_VEHICLES
+    return {
+        "num_vehicles": len(capacities),
+        "capacities": capacities,
+        "shift_hours": FLEET_SHIFT_HOURS,
+        "speed_kmh": FLEET_SPEED_KMH,
+        "service_minutes": FLEET_SERVICE_MINUTES,
+    }
+
+
+def travel_time_matrix(distance_matrix, fleet):
+    """Seconds from i to j: driving time plus service time at bin i"""
+    meters_per_second = fleet["speed_kmh"] / 3.6
+    time_matrix = np.asarray(distance_matrix) / meters_per_second
+    time_matrix[1:, :] += fleet["service_minutes"] * 60  # Depot has no service
+    np.fill_diagonal(time_matrix, 0)
+    return np.round(time_matrix).astype(np.int64)
+
+
+def register_travel_times(routing, manager, distances, fleet):
+    """Transit index for travel_time_matrix seconds (dense or sparse arcs)"""
+    if not isinstance(distances, SparseDistances):
+        return routing.RegisterTransitMatrix(
+            travel_time_matrix(distances, fleet).tolist()
+        )
+    if distances.native:
+        return routing.RegisterTransitMatrix(
+            travel_time_matrix(distances.dense(), fleet).tolist()
+        )
+
+    meters_per_second = fleet["speed_kmh"] / 3.6
+    service_seconds = fleet["service_minutes"] * 60
+
+    nodes = [manager.IndexToNode(i) for i in range(manager.GetNumberOfIndices())]
+
+    def travel_time(from_index, to_index):
+        from_node, to_node = nodes[from_index], nodes[to_index]
+        if from_node == to_node:
+            return 0
+        seconds = distances.cost(from_node, to_node) / meters_per_second
+        return int(round(seconds + (service_seconds if from_node else 0)))
+
+    return routing.RegisterTransitCallback(travel_time)
+
+
+def create_data_model(distance_matrix, num_bins, demands=None, fleet=None):
+    """
+    Create data model for OR-Tools solver. distance_matrix is a dense
+    matrix or SparseDistances (see get_arc_costs).
+    """
     data = {}
     data["distance_matrix"] = distance_matrix
     data["num_vehicles"] = 1
     data["depot"] = 0  # Depot is first location
+    if fleet is not None:
+        data["num_vehicles"] = fleet["num_vehicles"]
+        data["vehicle_capacities"] = list(fleet["capacities"])
+        data["demands"] = [0] + [int(d) for d in demands]  # Depot has no load
+        data["max_shift_seconds"] = int(fleet["shift_hours"] * 3600)
     return data
 
 
-def solve_tsp(distance_matrix):
+def adaptive_time_limit(num_locations):
+    """Search budget (seconds) scaled to the problem size"""
+    budget = num_locations * SOLVER_SECONDS_PER_LOCATION
+    return float(min(max(budget, SOLVER_MIN_SECONDS), SOLVER_MAX_SECONDS))
+
+
+def fetch_previous_route(route_id="route_1"):
+    """Return the bin ids of a stored route in stop order (empty if none)"""
+    route_data = get_storage().get_route(route_id) or {}
+    stops = route_data.get("stops") or []
+    if isinstance(stops, dict):
+        # Firebase returns list-like nodes as dicts when keys are sparse
+        stops = [stops[k] for k in sorted(stops, key=int)]
+    return [stop["bin_id"] for stop in stops if stop and stop.get("bin_id")]
+
+
+def build_warm_start(previous_bin_ids, bin_ids, distance_matrix):
+    """
+    Seed route (node indices, depot excluded) from the previous route's stop
+    order: bins still selected keep their order and new bins are placed by
+    cheapest insertion. Returns None when the overlap is too small to help.
+    """
+    node_of = {bin_id: node for node, bin_id in enumerate(bin_ids, start=1)}
+    route = [node_of[b] for b in dict.fromkeys(previous_bin_ids) if b in node_of]
+
+    if not bin_ids or len(route) / len(bin_ids) < WARM_START_MIN_OVERLAP:
+        return None
+
+    placed = set(route)
+    for node in range(1, len(bin_ids) + 1):
+        if node in placed:
+            continue
+        # Cost of inserting node between each consecutive pair (depot at ends)
+        tour = np.array([0] + route + [0])
+        prev, nxt = tour[:-1], tour[1:]
+        delta = (
+            distance_matrix[prev, node]
+            + distance_matrix[node, nxt]
+            - distance_matrix[prev, nxt]
+        )
+        route.insert(int(np.argmin(delta)), node)
+
+    return route
+
+
+def restrict_arcs(routing, manager, distances):
+    """
+    Limit each bin's successor to its kNN arcs in SparseDistances, a route
+    end, or itself (an unvisited optional node). The kNN graph holds both
+    directions, so every bin stays reachable.
+    """
+    ends = [routing.End(v) for v in range(routing.vehicles())]
+    for node in range(1, len(distances)):
+        index = manager.NodeToIndex(node)
+        successors = {
+            manager.NodeToIndex(other)
+            for other in distances.successors[node].tolist()
+            if other
+        }
+        successors.update(ends)
+        successors.add(index)
+        routing.NextVar(index).SetValues(sorted(successors))
+    print(f"Arcs restricted to {distances.k} nearest neighbours per bin")
+
+
+def register_distances(routing, manager, distances):
+    """
+    Transit index for arc lengths. A dense matrix is read inside OR-Tools,
+    so the search never calls back into Python per arc. SparseDistances
+    also restricts each bin's successors to its kNN arcs; it is registered
+    as a matrix too unless too large, and then looked up per arc.
+    """
+    if not isinstance(distances, SparseDistances):
+        return routing.RegisterTransitMatrix(
+            np.asarray(distances, dtype=np.int64).tolist()
+        )
+    if distances.native:
+        transit_callback_index = routing.RegisterTransitMatrix(
+            distances.dense().tolist()
+        )
+        restrict_arcs(routing, manager, distances)
+        return transit_callback_index
+
+    # The callback runs for every arc the search evaluates, including arcs
+    # outside the graph that restrict_arcs forbids; those are priced out
+    # instead of computed, and the rest are list and dict lookups
+    nodes = [manager.IndexToNode(i) for i in range(manager.GetNumberOfIndices())]
+    costs, n = distances.costs, len(distances)
+
+    def distance(from_index, to_index):
+        from_node, to_node = nodes[from_index], nodes[to_index]
+        if from_node == to_node:
+            return 0
+        return costs.get(from_node * n + to_node, UNSERVED_BIN_PENALTY)
+
+    transit_callback_index = routing.RegisterTransitCallback(distance)
+    restrict_arcs(routing, manager, distances)
+    return transit_callback_index
+
+
+def make_search_parameters(time_limit, strategy=DEFAULT_STRATEGY):
+    """
+    Search parameters for a (first solution, metaheuristic) strategy pair,
+    guided local search from a cheapest-arc start by default, limited to
+    time_limit seconds.
+    """
+    first_solution, metaheuristic = strategy
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = getattr(
+        routing_enums_pb2.FirstSolutionStrategy, first_solution
+    )
+    search_parameters.local_search_metaheuristic = getattr(
+        routing_enums_pb2.LocalSearchMetaheuristic, metaheuristic
+    )
+    search_parameters.time_limit.FromMilliseconds(int(time_limit * 1000))
+    return search_parameters
+
+
+def track_progress(
+    routing, no_improvement_seconds, progress=None, on_improvement=None
+):
+    """
+    Record (seconds, cost) for every improving solution of the routing
+    model and stop its search once no_improvement_seconds pass without one.
+    on_improvement() is called after each improving solution, while the
+    solution's variables can still be read. Returns the progress list,
+    filled in during the solve.
+    """
+    search_start = time.perf_counter()
+    progress = [] if progress is None else progress
+
+    def on_solution():
+        cost = routing.CostVar().Value()
+        if not progress or cost < progress[-1][1]:
+            progress.append((time.perf_counter() - search_start, cost))
+            if on_improvement is not None:
+                on_improvement()
+
+    def no_improvement():
+        if not progress:
+            return False
+        idle = time.perf_counter() - search_start - progress[-1][0]
+        return idle > no_improvement_seconds
+
+    routing.AddAtSolutionCallback(on_solution)
+    routing.AddSearchMonitor(routing.solver().CustomLimit(no_improvement))
+    return progress
+
+
+def print_search_summary(progress, time_limit):
+    """Print first and best solution cost against wall time"""
+    if not progress:
+        return
+    first_at, first_cost = progress[0]
+    best_at, best_cost = progress[-1]
+    print(
+        f"Search budget {time_limit:.1f}s: first solution {first_cost / 1000:.2f} "
+        f"at {first_at:.2f}s, best {best_cost / 1000:.2f} at {best_at:.2f}s "
+        f"({len(progress)} improvements)"
+    )
+
+
+def solve_tsp(
+    distance_matrix,
+    initial_route=None,
+    time_limit=None,
+    no_improvement_seconds=SOLVER_NO_IMPROVEMENT_SECONDS,
+    progress=None,
+    strategy=DEFAULT_STRATEGY,
+    on_route=None,
+):
     """
     Solve TSP using Google OR-Tools.
     Returns the optimal route as list of indices.
+
+    initial_route (node indices, depot excluded) warm-starts the search.
+    The search stops at time_limit (adaptive by default) or once no better
+    route has been found for no_improvement_seconds. If a list is passed as
+    progress, (seconds, cost) is appended for every improving solution, and
+    on_route(route) receives each improving route while the search runs.
     """
     print("\nSolving TSP with OR-Tools...")
 
@@ -202,29 +779,53 @@ def solve_tsp(distance_matrix):
     # Create routing model
     routing = pywrapcp.RoutingModel(manager)
 
-    # Create distance callback
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data["distance_matrix"][from_node][to_node]
-
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-
     # Define cost of each arc
+    transit_callback_index = register_distances(
+        routing, manager, data["distance_matrix"]
+    )
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
 
     # Set search parameters
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    )
-    search_parameters.local_search_metaheuristic = (
-        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    if time_limit is None:
+        time_limit = adaptive_time_limit(len(distance_matrix))
+    search_parameters = make_search_parameters(time_limit, strategy)
+
+    def publish_current_route():
+        route = []
+        index = routing.Start(0)
+        while not routing.IsEnd(index):
+            route.append(manager.IndexToNode(index))
+            index = routing.NextVar(index).Value()
+        route.append(manager.IndexToNode(index))
+        on_route(route)
+
+    progress = track_progress(
+        routing,
+        no_improvement_seconds,
+        progress,
+        publish_current_route if on_route is not None else None,
     )
-    search_parameters.time_limit.seconds = 30
 
-    # Solve
-    solution = routing.SolveWithParameters(search_parameters)
+    # A first-solution heuristic can get stuck inside the kNN graph, so
+    # sparse instances start from the nearest-neighbour route unless
+    # warm-started
+    if not initial_route and isinstance(distance_matrix, SparseDistances):
+        initial_route = distance_matrix.seed_route
+
+    # Solve, warm-starting from the seed route when one is given
+    solution = None
+    if initial_route:
+        routing.CloseModelWithParameters(search_parameters)
+        initial = routing.ReadAssignmentFromRoutes([list(initial_route)], True)
+        if initial:
+            print(f"Warm-starting from a seed route ({len(initial_route)} bins)")
+            solution = routing.SolveFromAssignmentWithParameters(
+                initial, search_parameters
+            )
+        else:
+            print("Warm start rejected by the model; solving from scratch")
+    if solution is None:
+        solution = routing.SolveWithParameters(search_parameters)
 
     if not solution:
         print("No solution found!")
@@ -247,10 +848,587 @@ def solve_tsp(distance_matrix):
 
     print(f"Optimal route found!")
     print(f"Total distance: {total_distance / 1000:.2f} km")
+    print_search_summary(progress, time_limit)
+
+    return route, total_distance
+
+
+def solve_vrp(
+    distance_matrix,
+    demands,
+    fleet,
+    time_limit=None,
+    no_improvement_seconds=SOLVER_NO_IMPROVEMENT_SECONDS,
+):
+    """
+    Solve the capacitated multi-vehicle VRP in one OR-Tools model.
+    demands are per bin (fill-percent units). Returns (vehicle_routes,
+    dropped_nodes): one dict per truck with its node sequence, distance (m),
+    load and shift seconds, and the bin nodes that could not be served.
+    """
+    print(f"\nSolving CVRP for {fleet['num_vehicles']} trucks with OR-Tools...")
+
+    data = create_data_model(distance_matrix, len(distance_matrix) - 1, demands, fleet)
+
+    manager = pywrapcp.RoutingIndexManager(
+        len(data["distance_matrix"]), data["num_vehicles"], data["depot"]
+    )
+    routing = pywrapcp.RoutingModel(manager)
+
+    # Arc cost: distance
+    transit_callback_index = register_distances(
+        routing, manager, data["distance_matrix"]
+    )
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    # Capacity: collected fill must fit each truck's payload
+    demand_callback_index = routing.RegisterUnaryTransitVector(data["demands"])
+    routing.AddDimensionWithVehicleCapacity(
+        demand_callback_index, 0, data["vehicle_capacities"], True, "Capacity"
+    )
+
+    # Shift time: driving plus service must fit the shift
+    time_callback_index = register_travel_times(
+        routing, manager, data["distance_matrix"], fleet
+    )
+    routing.AddDimension(
+        time_callback_index, 0, data["max_shift_seconds"], True, "Time"
+    )
+    time_dimension = routing.GetDimensionOrDie("Time")
+
+    # Every bin may be dropped at a penalty, so overload is never infeasible
+    for node in range(1, len(data["distance_matrix"])):
+        routing.AddDisjunction([manager.NodeToIndex(node)], UNSERVED_BIN_PENALTY)
+
+    if time_limit is None:
+        time_limit = adaptive_time_limit(len(distance_matrix))
+    search_parameters = make_search_parameters(time_limit)
+    progress = track_progress(routing, no_improvement_seconds)
+
+    solution = routing.SolveWithParameters(search_parameters)
+
+    if not solution:
+        print("No solution found!")
+        return None, None
+
+    vehicle_routes = []
+    for vehicle in range(data["num_vehicles"]):
+        route = []
+        distance = 0
+        load = 0
+        index = routing.Start(vehicle)
+        while not routing.IsEnd(index):
+            node = manager.IndexToNode(index)
+            route.append(node)
+            load += data["demands"][node]
+            previous_index = index
+            index = solution.Value(routing.NextVar(index))
+            distance += routing.GetArcCostForVehicle(previous_index, index, vehicle)
+        route.append(manager.IndexToNode(index))
+        vehicle_routes.append(
+            {
+                "route": route,
+                "distance": distance,
+                "load": load,
+                "shift_seconds": solution.Value(time_dimension.CumulVar(index)),
+            }
+        )
+
+    dropped = [
+        manager.IndexToNode(index)
+        for index in range(routing.Size())
+        if not routing.IsStart(index)
+        and solution.Value(routing.NextVar(index)) == index
+    ]
+
+    total_distance = sum(v["distance"] for v in vehicle_routes)
+    print(f"Fleet routes found! Total distance: {total_distance / 1000:.2f} km")
+    if dropped:
+        print(f"{len(dropped)} bins exceed the fleet's capacity or shift time")
+    print_search_summary(progress, time_limit)
+
+    return vehicle_routes, dropped
+
+
+def solve_fleet_routes(locations_df, fleet=None):
+    """
+    Capacitated fleet routing over every selected bin, with fill_level as
+    demand. Returns {route_id: route_data}, one route per truck in use.
+    """
+    fleet = fleet or get_fleet()
+    distance_matrix = get_arc_costs(locations_df)
+    demands = np.ceil(locations_df["fill_level"].to_numpy(dtype=np.float64))
+
+    vehicle_routes, dropped = solve_vrp(distance_matrix, demands, fleet)
+    if vehicle_routes is None:
+        return {}
+
+    routes = {}
+    for vehicle, result in enumerate(vehicle_routes):
+        capacity = fleet["capacities"][vehicle]
+        if len(result["route"]) <= 2:
+            print(f"  Truck {vehicle + 1}: idle")
+            continue
+        route_id = f"route_{len(routes) + 1}"
+        route_data = format_route(result["route"], locations_df, locations_df)
+        route_data["vehicle"] = vehicle + 1
+        route_data["load"] = int(result["load"])
+        route_data["capacity"] = capacity
+        route_data["shift_hours"] = round(result["shift_seconds"] / 3600, 2)
+        routes[route_id] = route_data
+        print(
+            f"  Truck {vehicle + 1} -> {route_id}: {route_data['total_bins']} bins, "
+            f"load {route_data['load']}/{capacity}, "
+            f"{result['distance'] / 1000:.2f} km, {route_data['shift_hours']:.2f} h"
+        )
+    if dropped:
+        dropped_ids = locations_df["bin_id"].iloc[np.asarray(dropped) - 1].tolist()
+        more = f" (+{len(dropped_ids) - 10} more)" if len(dropped_ids) > 10 else ""
+        print(f"  Unserved bins: {', '.join(dropped_ids[:10])}{more}")
+
+    return routes
+
+
+def select_prize_candidates(
+    locations_df,
+    threshold=TIME_THRESHOLD,
+    horizon=PRIZE_HORIZON_HOURS,
+    radius_km=PRIZE_NEIGHBOR_KM,
+    max_candidates=PRIZE_MAX_CANDIDATES,
+):
+    """
+    Urgent bins plus bins that fill up within the horizon and sit near an
+    urgent bin. The spatial index keeps this fast on large fleets: only
+    neighbourhoods of urgent bins are searched, never all pairs.
+    """
+    print(
+        f"\nSelecting prize-collecting candidates (urgent <= {threshold}h, "
+        f"neighbours within {radius_km} km filling within {horizon}h)..."
+    )
+    time_to_full = locations_df["time_to_full_h"].to_numpy()
+    seeds = locations_df[time_to_full <= threshold]
+    if seeds.empty:
+        seeds = locations_df.nsmallest(MAX_BINS_PER_ROUTE, "time_to_full_h")
+
+    index = get_bin_index()
+    nearby_ids = index.bin_ids[
+        index.query_radius(seeds["latitude"], seeds["longitude"], radius_km)
+    ]
+    neighbours = locations_df[
+        (time_to_full <= horizon) & locations_df["bin_id"].isin(nearby_ids)
+    ]
+
+    candidates = (
+        pd.concat([seeds, neighbours])
+        .drop_duplicates("bin_id")
+        .nsmallest(max_candidates, "time_to_full_h")
+        .reset_index(drop=True)
+    )
+    num_urgent = int(candidates["bin_id"].isin(seeds["bin_id"]).sum())
+    print(
+        f"Selected {len(candidates)} candidates "
+        f"({num_urgent} urgent, {len(candidates) - num_urgent} nearby)"
+    )
+    return candidates
+
+
+def urgency_penalties(
+    candidates, threshold=TIME_THRESHOLD, horizon=PRIZE_HORIZON_HOURS
+):
+    """
+    Drop penalty (meters) per candidate. Urgent bins are priced like an
+    unserved bin; others by their depot round trip, so the prize scales
+    with the instance: a bin about to fill is worth most of the trip.
+    """
+    time_to_full = candidates["time_to_full_h"].to_numpy(dtype=np.float64)
+    round_trip_m = 2000 * haversine_pairs(
+        DEPOT_LAT,
+        DEPOT_LON,
+        candidates["latitude"].to_numpy(dtype=np.float64),
+        candidates["longitude"].to_numpy(dtype=np.float64),
+    )
+    urgency = 1 - np.clip(time_to_full / horizon, 0, 1)
+    penalties = np.maximum(PRIZE_MIN_PENALTY_M, urgency * round_trip_m)
+    penalties[time_to_full <= threshold] = UNSERVED_BIN_PENALTY
+    return penalties.astype(np.int64)
+
+
+def solve_prize_collecting(
+    distance_matrix,
+    penalties,
+    max_stops=MAX_BINS_PER_ROUTE,
+    time_limit=None,
+    no_improvement_seconds=SOLVER_NO_IMPROVEMENT_SECONDS,
+):
+    """
+    Single-truck TSP where every bin is optional: skipping bin i costs
+    penalties[i - 1]. Coverage and order are decided together, with at most
+    max_stops bins visited. Returns (route, total_distance, dropped_nodes).
+    """
+    print("\nSolving prize-collecting route with OR-Tools...")
+
+    data = create_data_model(distance_matrix, len(distance_matrix) - 1)
+
+    manager = pywrapcp.RoutingIndexManager(
+        len(data["distance_matrix"]), data["num_vehicles"], data["depot"]
+    )
+    routing = pywrapcp.RoutingModel(manager)
+
+    transit_callback_index = register_distances(
+        routing, manager, data["distance_matrix"]
+    )
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    # Each visited bin counts one stop
+    stops_callback_index = routing.RegisterUnaryTransitVector(
+        [0] + [1] * (len(data["distance_matrix"]) - 1)
+    )
+    routing.AddDimension(stops_callback_index, 0, max_stops, True, "Stops")
+
+    for node, penalty in enumerate(penalties, start=1):
+        routing.AddDisjunction([manager.NodeToIndex(node)], int(penalty))
+
+    if time_limit is None:
+        time_limit = adaptive_time_limit(min(len(distance_matrix), max_stops + 1))
+    search_parameters = make_search_parameters(time_limit)
+    progress = track_progress(routing, no_improvement_seconds)
+
+    solution = routing.SolveWithParameters(search_parameters)
+
+    if not solution:
+        print("No solution found!")
+        return None, None, None
+
+    route = []
+    total_distance = 0
+    index = routing.Start(0)
+    while not routing.IsEnd(index):
+        route.append(manager.IndexToNode(index))
+        previous_index = index
+        index = solution.Value(routing.NextVar(index))
+        total_distance += routing.GetArcCostForVehicle(previous_index, index, 0)
+    route.append(manager.IndexToNode(index))
+
+    dropped = [
+        manager.IndexToNode(index)
+        for index in range(routing.Size())
+        if not routing.IsStart(index)
+        and solution.Value(routing.NextVar(index)) == index
+    ]
+
+    print(
+        f"Route found! {len(route) - 2} of {len(penalties)} candidates, "
+        f"total distance: {total_distance / 1000:.2f} km"
+    )
+    print_search_summary(progress, time_limit)
+
+    return route, total_distance, dropped
+
+
+def solve_prize_route(predictions_df):
+    """
+    Prize-collecting mode: the solver picks bins from urgency-weighted
+    candidates instead of a fixed threshold + top-N filter.
+    Returns {route_id: route_data}.
+    """
+    bin_ids = predictions_df["bin_id"].tolist()
+    locations_df = predictions_df.merge(
+        fetch_bin_locations(bin_ids), on="bin_id", how="inner"
+    )
+    candidates = select_prize_candidates(locations_df)
+    if candidates.empty:
+        return {}
+
+    distance_matrix = get_arc_costs(candidates)
+    penalties = urgency_penalties(candidates)
+
+    route, _, dropped = solve_prize_collecting(distance_matrix, penalties)
+    if route is None:
+        return {}
+    if len(route) <= 2:
+        print("No candidate was worth the trip; no route saved")
+        return {}
+
+    urgent_dropped = (
+        candidates["time_to_full_h"].iloc[np.asarray(dropped, dtype=int) - 1]
+        <= TIME_THRESHOLD
+    ).sum()
+    if urgent_dropped:
+        print(f"{urgent_dropped} urgent bins were left for a later route")
+
+    route_data = format_route(route, candidates, candidates)
+    print_route_details(route_data)
+    return {"route_1": route_data}
+
+
+def strategy_name(strategy):
+    """Readable key for a (first solution, metaheuristic) pair"""
+    return "+".join(strategy)
+
+
+def size_bucket(num_bins):
+    """Instance-size label used to group portfolio statistics"""
+    for bound in PORTFOLIO_SIZE_BUCKETS:
+        if num_bins <= bound:
+            return f"<={bound}"
+    return f">{PORTFOLIO_SIZE_BUCKETS[-1]}"
+
+
+def load_portfolio_stats(path=PORTFOLIO_STATS_PATH):
+    """{size bucket: {strategy: {"runs", "wins"}}}, empty if never recorded"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_portfolio_result(results, winners, num_bins, path=PORTFOLIO_STATS_PATH):
+    """
+    Add one portfolio run to the per-size win statistics. Strategies tied
+    for the cheapest route split the win. The read-modify-write runs under
+    a file lock so concurrent API and CLI runs don't lose updates.
+    """
+    with file_lock(path):
+        stats = load_portfolio_stats(path)
+        bucket = stats.setdefault(size_bucket(num_bins), {})
+        for name in results:
+            entry = bucket.setdefault(name, {"runs": 0, "wins": 0})
+            entry["runs"] += 1
+            if name in winners:
+                entry["wins"] = round(entry["wins"] + 1 / len(winners), 4)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(stats, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    return stats
+
+
+def recommended_strategy(num_bins, path=PORTFOLIO_STATS_PATH):
+    """Strategy with the best win rate for this instance size, or None"""
+    bucket = load_portfolio_stats(path).get(size_bucket(num_bins), {})
+    if not bucket:
+        return None
+    return max(bucket, key=lambda name: bucket[name]["wins"] / bucket[name]["runs"])
+
+
+def solve_strategy(task, quiet=True):
+    """
+    Process-pool worker: solve the TSP with one strategy, cold or from
+    initial_route. Returns (name, route, total_distance, seconds,
+    best_at_seconds). quiet silences the solver log; only use it in a
+    worker process, since redirect_stdout swaps the process-wide stdout.
+    """
+    name, strategy, distance_matrix, initial_route, time_limit = task
+    start = time.perf_counter()
+    progress = []
+    with redirect_stdout(io.StringIO()) if quiet else nullcontext():
+        route, total_distance = solve_tsp(
+            distance_matrix,
+            initial_route,
+            time_limit=time_limit,
+            progress=progress,
+            strategy=strategy,
+        )
+    best_at = progress[-1][0] if progress else None
+    return name, route, total_distance, time.perf_counter() - start, best_at
+
+
+def solve_tsp_portfolio(
+    distance_matrix,
+    initial_route=None,
+    time_limit=None,
+    strategies=PORTFOLIO_STRATEGIES,
+    workers=ROUTING_WORKERS,
+):
+    """
+    Run several strategies concurrently and keep the cheapest route within
+    the caller's wall-clock budget: with fewer workers than strategies they
+    run in rounds, and the budget is split between the rounds. Each strategy
+    builds its own first solution; initial_route is tried as a separate
+    warm-start entry (the default metaheuristic from the seed route). Wins
+    are added to the portfolio statistics. Returns (route, total_distance)
+    like solve_tsp.
+    """
+    if time_limit is None:
+        time_limit = adaptive_time_limit(len(distance_matrix))
+    entries = [(strategy_name(s), s, None) for s in strategies]
+    if initial_route:
+        entries.append(
+            (f"WARM_START+{DEFAULT_STRATEGY[1]}", DEFAULT_STRATEGY, initial_route)
+        )
+
+    workers = max(1, min(workers, len(entries)))
+    rounds = -(-len(entries) // workers)
+    strategy_limit = time_limit / rounds
+    tasks = [
+        (name, strategy, distance_matrix, route, strategy_limit)
+        for name, strategy, route in entries
+    ]
+    print(
+        f"\nSolving TSP with a portfolio of {len(tasks)} strategies on {workers} "
+        f"worker(s) ({strategy_limit:.1f}s budget each, {time_limit:.1f}s total)..."
+    )
+
+    if workers == 1:
+        # In-process: keep the solver log rather than swapping stdout under
+        # concurrent API jobs
+        outcomes = [solve_strategy(task, quiet=False) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(solve_strategy, tasks))
+
+    results = {}
+    for name, route, total_distance, seconds, best_at in outcomes:
+        if route is None:
+            print(f"  {name:<45} no solution")
+            continue
+        results[name] = (route, total_distance)
+        print(
+            f"  {name:<45} {total_distance / 1000:8.2f} km "
+            f"(best at {best_at or 0:.2f}s, {seconds:.2f}s)"
+        )
+
+    if not results:
+        print("No solution found!")
+        return None, None
+
+    best_distance = min(distance for _, distance in results.values())
+    winners = [name for name in results if results[name][1] == best_distance]
+    route, total_distance = results[winners[0]]
+    num_bins = len(distance_matrix) - 1
+    record_portfolio_result(results, winners, num_bins)
+    tie = f" (tied, {len(winners)} share the win)" if len(winners) > 1 else ""
+    print(
+        f"Best strategy: {', '.join(winners)} ({total_distance / 1000:.2f} km){tie}"
+    )
+    print(
+        f"Recommended for {size_bucket(num_bins)} bins so far: "
+        f"{recommended_strategy(num_bins)}"
+    )
 
     return route, total_distance
 
 
+def cluster_bins(locations_df, cluster_size=CLUSTER_SIZE, method=CLUSTER_METHOD):
+    """
+    Partition bins into spatial clusters of about cluster_size bins.
+    sweep:  sort by polar angle around the depot and cut into equal arcs
+    kmeans: k-means on projected coordinates (cluster sizes may vary)
+    Returns a list of row-position arrays into locations_df, most urgent
+    cluster first.
+    """
+    n = len(locations_df)
+    k = max(1, int(np.ceil(n / cluster_size)))
+    x, y = project_to_plane(
+        locations_df["latitude"], locations_df["longitude"], DEPOT_LAT, DEPOT_LON
+    )
+
+    if method == "kmeans":
+        from sklearn.cluster import KMeans
+
+        labels = KMeans(n_clusters=k, n_init=4, random_state=0).fit_predict(
+            np.column_stack([x, y])
+        )
+        clusters = [np.flatnonzero(labels == c) for c in range(k)]
+    elif method == "sweep":
+        angle = np.arctan2(y, x)
+        order = np.argsort(angle, kind="stable")
+        # Start the sweep after the widest angular gap so no arc wraps around
+        # the occupied sector
+        sorted_angle = angle[order]
+        gaps = np.diff(np.append(sorted_angle, sorted_angle[0] + 2 * np.pi))
+        order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+        clusters = np.array_split(order, k)
+    else:
+        raise ValueError(f"Unknown cluster method '{method}'")
+
+    clusters = [c for c in clusters if len(c)]
+    if "time_to_full_h" in locations_df:
+        urgency = locations_df["time_to_full_h"].to_numpy()
+        clusters.sort(key=lambda c: urgency[c].min())
+    return clusters
+
+
+def solve_cluster(task):
+    """
+    Process-pool worker: build the cluster's distance matrix and solve its
+    TSP. Returns (route_id, route, total_distance, seconds).
+    """
+    route_id, locations_df, previous_bin_ids, time_limit = task
+    start = time.perf_counter()
+
+    # Per-cluster solver output would interleave across processes
+    with redirect_stdout(io.StringIO()):
+        distance_matrix = create_distance_matrix(locations_df)
+        initial_route = build_warm_start(
+            previous_bin_ids, locations_df["bin_id"].tolist(), distance_matrix
+        )
+        route, total_distance = solve_tsp(
+            distance_matrix, initial_route, time_limit=time_limit
+        )
+
+    return route_id, route, total_distance, time.perf_counter() - start
+
+
+def solve_clustered_routes(
+    locations_df,
+    cluster_size=CLUSTER_SIZE,
+    method=CLUSTER_METHOD,
+    workers=ROUTING_WORKERS,
+    time_limit=None,
+):
+    """
+    Cluster-first, route-second: split bins spatially and solve one TSP per
+    cluster in a process pool. Returns {route_id: route_data}.
+    """
+    start = time.perf_counter()
+    clusters = cluster_bins(locations_df, cluster_size, method)
+    print(
+        f"\nSplit {len(locations_df)} bins into {len(clusters)} clusters "
+        f"({method}, <= {cluster_size} bins each)"
+    )
+
+    cluster_frames = {}
+    tasks = []
+    for k, positions in enumerate(clusters, start=1):
+        route_id = f"route_{k}"
+        cluster_df = locations_df.iloc[positions].reset_index(drop=True)
+        cluster_frames[route_id] = cluster_df
+        tasks.append((route_id, cluster_df, fetch_previous_route(route_id), time_limit))
+
+    workers = max(1, min(workers, len(tasks)))
+    print(f"Solving {len(tasks)} clusters with {workers} process(es)...")
+    if workers == 1:
+        results = list(map(solve_cluster, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(solve_cluster, tasks))
+
+    routes = {}
+    solve_total = 0.0
+    for route_id, route, total_distance, seconds in results:
+        solve_total += seconds
+        cluster_df = cluster_frames[route_id]
+        if route is None:
+            print(f"  {route_id}: no solution ({len(cluster_df)} bins)")
+            continue
+        print(
+            f"  {route_id}: {len(cluster_df):>3} bins, "
+            f"{total_distance / 1000:8.2f} km, solved in {seconds:.2f}s"
+        )
+        routes[route_id] = format_route(route, cluster_df, cluster_df)
+
+    wall = time.perf_counter() - start
+    print(
+        f"Solved {len(routes)} routes in {wall:.2f}s wall "
+        f"({solve_total:.2f}s summed solve time, "
+        f"{solve_total / wall if wall else 0:.1f}x parallel speedup)"
+    )
+    return routes
+
+
 def format_route(route, locations_df, predictions_df):
     """
     Format route into readable structure for Firebase.
@@ -264,6 +1442,7 @@ def format_route(route, locations_df, predictions_df):
     }
 
     total_distance = 0
+    predictions_by_bin = predictions_df.drop_duplicates("bin_id").set_index("bin_id")
 
     for i, node_idx in enumerate(route):
         if node_idx == 0:
@@ -280,7 +1459,7 @@ def format_route(route, locations_df, predictions_df):
             bin_id = bin_row["bin_id"]
 
             # Get prediction data
-            pred_row = predictions_df[predictions_df["bin_id"] == bin_id].iloc[0]
+            pred_row = predictions_by_bin.loc[bin_id]
 
             stop = {
                 "order": i,
@@ -315,8 +1494,7 @@ def save_route_to_firebase(route_data, route_id="route_1"):
     """Save optimized route to Firebase"""
     print(f"\nSaving route to Firebase at /routes/{route_id}...")
 
-    ref = db.reference(f"/routes/{route_id}")
-    ref.set(route_data)
+    get_storage().set_route(route_id, route_data)
 
     print(f"Route saved successfully!")
     print(f"\nRoute Summary:")
@@ -325,6 +1503,19 @@ def save_route_to_firebase(route_data, route_id="route_1"):
     print(f"  Number of stops: {len(route_data['stops'])}")
 
 
+def save_routes_to_firebase(routes):
+    """Save one route per truck and remove numbered routes left over from
+    an earlier run with more trucks"""
+    for route_id, route_data in routes.items():
+        save_route_to_firebase(route_data, route_id)
+
+    storage = get_storage()
+    for route_id in storage.get_route_ids():
+        if re.fullmatch(r"route_\d+", route_id) and route_id not in routes:
+            storage.delete_route(route_id)
+            print(f"Removed stale route /routes/{route_id}")
+
+
 def print_route_details(route_data):
     """Print detailed route information"""
     print("\n=== OPTIMIZED COLLECTION ROUTE ===\n")
@@ -345,53 +1536,201 @@ def print_route_details(route_data):
         print()
 
 
-def main():
-    """Main routing optimization pipeline"""
-    try:
-        start_time = time.time()
+class AnytimeRoutePublisher:
+    """
+    Publishes improving routes to /routes/{route_id} while the solver runs.
+    The solver callback only hands over the node list; formatting and the
+    write happen on a background thread, at most once per interval and
+    always with the newest route.
+    """
 
-        # Initialize Firebase
-        init_firebase()
+    def __init__(self, route_id, format_fn, interval=ANYTIME_PUBLISH_INTERVAL):
+        self.route_id = route_id
+        self.format_fn = format_fn
+        self.interval = interval
+        self.version = 0
+        self.pending = None
+        self.closed = False
+        self.last_published = float("-inf")
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, route):
+        """Queue a route, replacing any not yet published"""
+        with self.condition:
+            self.pending = list(route)
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                wait = self.last_published + self.interval - time.monotonic()
+                if wait > 0:
+                    # A newer route may replace the pending one meanwhile
+                    self.condition.wait(wait)
+                    continue
+                route, self.pending = self.pending, None
+                self.version += 1
+                version = self.version
+                self.last_published = time.monotonic()
+
+            route_data = self.format_fn(route)
+            route_data["version"] = version
+            route_data["is_final"] = False
+            get_storage().set_route(self.route_id, route_data)
+            print(
+                f"Published /routes/{self.route_id} v{version} "
+                f"({route_data['total_distance_km']:.2f} km)"
+            )
 
-        # Fetch predictions
-        predictions_df = fetch_predictions()
+    def close(self):
+        """Stop publishing; returns the version the final route should use"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        return self.version + 1
 
-        if predictions_df.empty:
-            print("No predictions available. Run inference.py first.")
-            return
 
-        # Select bins for collection
-        selected_bins = select_bins_for_collection(predictions_df)
+def solve_single_route(locations_df, anytime=USE_ANYTIME):
+    """One truck, one TSP over every selected bin. Returns {route_id: route_data}"""
+    # Create distance matrix
+    distance_matrix = get_distance_matrix(locations_df)
 
-        if selected_bins.empty:
-            print("No bins selected for collection")
-            return
+    # Warm-start from the previous route when the bin set overlaps
+    initial_route = build_warm_start(
+        fetch_previous_route(), locations_df["bin_id"].tolist(), distance_matrix
+    )
 
-        # Fetch bin locations
-        bin_ids = selected_bins["bin_id"].tolist()
-        locations_df = fetch_bin_locations(bin_ids)
+    # Solve TSP
+    publisher = None
+    if USE_PORTFOLIO:
+        route, total_distance = solve_tsp_portfolio(distance_matrix, initial_route)
+    elif anytime:
+        publisher = AnytimeRoutePublisher(
+            "route_1", lambda r: format_route(r, locations_df, locations_df)
+        )
+        try:
+            route, total_distance = solve_tsp(
+                distance_matrix, initial_route, on_route=publisher.submit
+            )
+        finally:
+            final_version = publisher.close()
+    else:
+        route, total_distance = solve_tsp(distance_matrix, initial_route)
 
-        # Create distance matrix
-        distance_matrix = create_distance_matrix(locations_df)
+    if route is None:
+        return {}
 
-        # Solve TSP
-        route, total_distance = solve_tsp(distance_matrix)
+    # Format route
+    route_data = format_route(route, locations_df, locations_df)
+    if publisher is not None:
+        route_data["version"] = final_version
+        route_data["is_final"] = True
 
-        if route is None:
-            print("Failed to find optimal route")
-            return
+    # Print route details
+    print_route_details(route_data)
+
+    return {"route_1": route_data}
+
+
+def route_selected_bins(predictions_df, mode, anytime=USE_ANYTIME):
+    """
+    Threshold + top-N selection followed by the single, cluster or fleet
+    solver. Returns {route_id: route_data}, or None if no bin was selected.
+    """
+    # Select bins for collection (cluster and fleet modes are not capped)
+    max_bins = None if mode in ("cluster", "fleet") else MAX_BINS_PER_ROUTE
+    selected_bins = select_bins_for_collection(predictions_df, max_bins=max_bins)
+
+    if selected_bins.empty:
+        print("No bins selected for collection")
+        return None
+
+    # Fetch bin locations and join them onto the selected predictions
+    bin_ids = selected_bins["bin_id"].tolist()
+    locations_df = selected_bins.merge(
+        fetch_bin_locations(bin_ids), on="bin_id", how="inner"
+    )
+
+    if mode == "cluster":
+        return solve_clustered_routes(locations_df)
+    if mode == "fleet":
+        return solve_fleet_routes(locations_df)
+    if mode == "single":
+        return solve_single_route(locations_df, anytime)
+    raise ValueError(f"Unknown routing mode '{mode}'")
 
-        # Format route
-        route_data = format_route(route, locations_df, selected_bins)
 
-        # Print route details
-        print_route_details(route_data)
+def optimize_routes(predictions_df, mode=None, anytime=USE_ANYTIME):
+    """
+    Build routes from a predictions frame (bin_id, time_to_full_h,
+    fill_level) in the given mode. Returns {route_id: route_data}, {} if no
+    route was found, or None if no bin needed collection.
+    """
+    mode = mode or ROUTING_MODE
+    if mode == "prize":
+        # The solver selects bins itself from urgency-weighted candidates
+        return solve_prize_route(predictions_df)
+    return route_selected_bins(predictions_df, mode, anytime)
+
+
+def summarize_routes(routes):
+    """Compact per-route summary (no stops) for run statistics"""
+    return {
+        route_id: {
+            "total_bins": route_data["total_bins"],
+            "total_distance_km": route_data["total_distance_km"],
+        }
+        for route_id, route_data in routes.items()
+    }
+
+
+def main(mode=None):
+    """
+    Main routing optimization pipeline.
+    Returns run statistics with per-stage timings (seconds) for callers such
+    as the API job queue.
+    """
+    mode = mode or ROUTING_MODE
+    stats = {"mode": mode, "routes": {}, "timings": {}}
+    timings = stats["timings"]
+    try:
+        start_time = time.time()
+
+        # Fetch predictions
+        start = time.perf_counter()
+        predictions_df = fetch_predictions()
+        timings["fetch_predictions"] = time.perf_counter() - start
+
+        if predictions_df.empty:
+            print("No predictions available. Run inference.py first.")
+            return stats
+
+        start = time.perf_counter()
+        routes = optimize_routes(predictions_df, mode)
+        timings["solve"] = time.perf_counter() - start
+        if routes is None:
+            return stats
+
+        if not routes:
+            print("Failed to find optimal route")
+            return stats
 
         # Save to Firebase
-        save_route_to_firebase(route_data)
+        start = time.perf_counter()
+        save_routes_to_firebase(routes)
+        timings["save"] = time.perf_counter() - start
+        stats["routes"] = summarize_routes(routes)
 
         elapsed = time.time() - start_time
         print(f"\n✓ Route optimization completed in {elapsed:.2f} seconds")
+        return stats
 
     except Exception as e:
         print(f"Error during route optimization: {e}")
@@ -399,4 +1738,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
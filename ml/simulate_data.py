@@ -5,12 +5,12 @@ Creates historical data and current bin states for testing the entire pipeline.
 """
 
 import numpy as np
-import firebase_admin
-from firebase_admin import credentials, db
 from datetime import datetime, timedelta
 import time
 import random
 
+from storage import get_storage
+
 # Configuration
 NUM_BINS = 25
 DAYS_OF_HISTORY = 30
@@ -30,18 +30,6 @@ FILL_PROFILES = {
 }
 
 
-def init_firebase():
-    """Initialize Firebase Admin SDK"""
-    if not firebase_admin._apps:
-        cred = credentials.Certificate("serviceAccountKey.json")
-        firebase_admin.initialize_app(
-            cred,
-            {
-                "databaseURL": "https://smart-waste-3d7d0-default-rtdb.europe-west1.firebasedatabase.app/"
-            },
-        )
-
-
 def generate_bin_metadata(num_bins):
     """Generate metadata for bins"""
     bins = []
@@ -146,9 +134,7 @@ def write_to_firebase(bins_metadata, historical_data):
     """Write simulated data to Firebase"""
     print("Writing data to Firebase...")
 
-    # Write historical data
-    history_ref = db.reference("/history")
-    bins_ref = db.reference("/bins")
+    storage = get_storage()
 
     for bin_meta, (history, current_fill) in zip(bins_metadata, historical_data):
         bin_id = bin_meta["bin_id"]
@@ -165,11 +151,12 @@ def write_to_firebase(bins_metadata, historical_data):
                 "longitude": reading["longitude"],
             }
 
-        history_ref.child(bin_id).set(bin_history)
+        storage.set_history(bin_id, bin_history)
 
         # Write current bin state (most recent reading)
         latest = history[-1]
-        bins_ref.child(bin_id).set(
+        storage.set_bin(
+            bin_id,
             {
                 "fill_level": latest["fill_level"],
                 "latitude": latest["latitude"],
@@ -214,9 +201,6 @@ def main():
     try:
         print("=== WASTE BIN DATA SIMULATOR ===\n")
 
-        # Initialize Firebase
-        init_firebase()
-
         # Generate bin metadata
         print(f"Generating metadata for {NUM_BINS} bins...")
         bins_metadata = generate_bin_metadata(NUM_BINS)
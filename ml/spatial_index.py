@@ -0,0 +1,80 @@
+"""
+Spatial Index
+KD-tree over bin locations for fast neighbour queries.
+Coordinates are projected to a local plane (km) around an origin, so
+Euclidean distances in the tree approximate ground distance over a city.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from geo import project_to_plane
+
+
+class SpatialIndex:
+    """
+    KD-tree over the bins in locations_df (bin_id, latitude, longitude).
+    Query results are row positions into locations_df.
+    """
+
+    def __init__(self, locations_df, origin=None):
+        self.bin_ids = locations_df["bin_id"].to_numpy()
+        latitudes = locations_df["latitude"].to_numpy(dtype=np.float64)
+        longitudes = locations_df["longitude"].to_numpy(dtype=np.float64)
+
+        if origin is None:
+            origin = (
+                float(latitudes.mean()) if len(latitudes) else 0.0,
+                float(longitudes.mean()) if len(longitudes) else 0.0,
+            )
+        self.origin = origin
+
+        self.points = self.project(latitudes, longitudes)
+        self.tree = cKDTree(self.points)
+
+    def __len__(self):
+        return len(self.bin_ids)
+
+    def project(self, latitudes, longitudes):
+        """(n, 2) array of plane coordinates (km) for the given points"""
+        x, y = project_to_plane(latitudes, longitudes, *self.origin)
+        return np.column_stack([np.atleast_1d(x), np.atleast_1d(y)])
+
+    def query_radius(self, latitudes, longitudes, radius_km):
+        """Sorted positions of bins within radius_km of any query point"""
+        if not len(self) or not len(np.atleast_1d(latitudes)):
+            return np.empty(0, dtype=np.int64)
+        queries = cKDTree(self.project(latitudes, longitudes))
+        hits = queries.query_ball_tree(self.tree, radius_km)
+        return np.unique(np.fromiter((p for row in hits for p in row), dtype=np.int64))
+
+    def nearest(self, latitudes, longitudes, k=1):
+        """(distances_km, positions) of the k nearest bins to each query point"""
+        k = min(k, len(self))
+        return self.tree.query(self.project(latitudes, longitudes), k=k)
+
+    def neighbors(self, k):
+        """(n, k) positions of each bin's k nearest other bins"""
+        k = min(k, len(self) - 1)
+        if k <= 0:
+            return np.empty((len(self), 0), dtype=np.int64)
+        _, positions = self.tree.query(self.points, k=k + 1)
+        positions = positions.reshape(len(self), k + 1)
+        # Drop each bin itself (normally column 0; any column on ties)
+        is_self = positions == np.arange(len(self))[:, None]
+        is_self[~is_self.any(axis=1), -1] = True
+        return positions[~is_self].reshape(len(self), k)
+
+    def neighbor_arcs(self, k):
+        """
+        Sparse kNN graph as (from, to) position arrays with both directions,
+        n * k to 2 * n * k arcs instead of the n^2 of a dense matrix.
+        """
+        neighbors = self.neighbors(k)
+        rows = np.repeat(np.arange(len(self)), neighbors.shape[1])
+        cols = neighbors.ravel()
+        # Dedupe both directions as flat from * n + to keys
+        n = len(self)
+        keys = np.unique(np.concatenate([rows * n + cols, cols * n + rows]))
+        return keys // n, keys % n
+
@@ -0,0 +1,617 @@
+"""
+Storage Module
+One interface for everything the pipeline reads and writes: bins, history,
+predictions and routes.
+
+FirebaseStorage talks to the Realtime Database. SQLiteStorage is a local
+stand-in (a database file or purely in-memory) so the pipeline can run and
+be benchmarked offline, without paying network latency.
+
+Select the backend with SMART_WASTE_STORAGE=firebase|sqlite|memory
+(default: firebase). SMART_WASTE_SQLITE_PATH sets the database file used by
+the "sqlite" backend.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Configuration
+STORAGE_BACKEND = os.environ.get("SMART_WASTE_STORAGE", "firebase")
+SQLITE_PATH = os.environ.get("SMART_WASTE_SQLITE_PATH", "data/smart_waste.db")
+
+FIREBASE_CREDENTIALS = "serviceAccountKey.json"
+FIREBASE_DATABASE_URL = (
+    "https://smart-waste-3d7d0-default-rtdb.europe-west1.firebasedatabase.app/"
+)
+
+HISTORY_FETCH_WORKERS = 16  # Max concurrent /history requests during bulk fetch
+POLL_INTERVAL = 1.0  # Seconds between change polls for local listeners
+
+# Mirrors firebase_admin.db.Event so listeners work with either backend
+BinsEvent = namedtuple("BinsEvent", ["event_type", "path", "data"])
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def history_to_points(history):
+    """Convert a history dict ({timestamp: reading}) into (timestamp, fill) tuples"""
+    points = []
+    for ts_str, data in history.items():
+        try:
+            # FIX: Force convert String timestamp to Float
+            ts = float(ts_str)
+            fill = float(data.get("fill_level", 0))
+            points.append((ts, fill))
+        except ValueError:
+            continue
+    return points
+
+
+def points_to_frame(bin_points):
+    """
+    Build the columnar history frame (bin_id, ts, fill) from
+    (bin_id, points) pairs, sorted by bin and time.
+    """
+    bin_col, ts_col, fill_col = [], [], []
+    for bin_id, points in bin_points:
+        for ts, fill in points:
+            bin_col.append(bin_id)
+            ts_col.append(ts)
+            fill_col.append(fill)
+
+    history_df = pd.DataFrame(
+        {
+            "bin_id": bin_col,
+            "ts": np.asarray(ts_col, dtype=np.float64),
+            "fill": np.asarray(fill_col, dtype=np.float64),
+        }
+    )
+    # Stable sort keeps key order for equal timestamps
+    return history_df.sort_values(["bin_id", "ts"], kind="stable").reset_index(
+        drop=True
+    )
+
+
+def apply_multipath_update(tree, updates):
+    """Apply a Firebase-style multi-path update ({"a/b": v}) to a nested dict"""
+    for path, value in updates.items():
+        parts = [p for p in path.split("/") if p]
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+    return tree
+
+
+class Storage:
+    """Interface shared by all storage backends"""
+
+    name = "base"
+
+    # --- Bins ---
+    def get_bins(self):
+        """Return {bin_id: state} for every bin"""
+        raise NotImplementedError
+
+    def get_bin(self, bin_id):
+        """Return one bin's state, or None"""
+        raise NotImplementedError
+
+    def set_bin(self, bin_id, data):
+        """Replace one bin's state"""
+        raise NotImplementedError
+
+    def listen_bins(self, callback):
+        """
+        Call callback(event) for every change under /bins. The first event is
+        a full snapshot (path "/"). Returns an object with close().
+        """
+        raise NotImplementedError
+
+    # --- History ---
+    def get_history(self, bin_id, limit=None):
+        """Return {timestamp: reading} for one bin, the last `limit` entries"""
+        raise NotImplementedError
+
+    def get_histories(self, bin_ids, limit):
+        """
+        Return the last `limit` readings of many bins as a columnar frame
+        (bin_id, ts, fill). frame.attrs["fetch_stats"] holds the request count.
+        """
+        raise NotImplementedError
+
+    def get_history_heads(self):
+        """
+        Return {bin_id: last-write timestamp} for every bin with recorded
+        history, without reading the history itself. The timestamp is at or
+        after the bin's newest reading (None when unknown).
+        """
+        raise NotImplementedError
+
+    def get_history_since(self, bin_id, after=None, limit=None):
+        """
+        Return {timestamp: reading} for one bin: the first `limit` readings
+        after `after` (a key-range page; all readings when both are None)
+        """
+        raise NotImplementedError
+
+    def add_history(self, bin_id, timestamp, data):
+        """Record one reading"""
+        raise NotImplementedError
+
+    def set_history(self, bin_id, readings):
+        """Replace a bin's history with {timestamp: reading}"""
+        raise NotImplementedError
+
+    # --- Predictions ---
+    def get_predictions(self):
+        """Return {bin_id: prediction}"""
+        raise NotImplementedError
+
+    def update_predictions(self, updates):
+        """Apply a multi-path update ("bin_id" or "bin_id/field" keys)"""
+        raise NotImplementedError
+
+    def listen_predictions(self, callback):
+        """
+        Like listen_bins, for /predictions. Returns None when the backend
+        cannot push changes; callers then poll get_predictions().
+        """
+        return None
+
+    # --- Routes ---
+    def get_route(self, route_id):
+        """Return a stored route, or None"""
+        raise NotImplementedError
+
+    def set_route(self, route_id, data):
+        """Replace a stored route"""
+        raise NotImplementedError
+
+    def get_route_ids(self):
+        """Return the ids of every stored route"""
+        raise NotImplementedError
+
+    def delete_route(self, route_id):
+        """Remove a stored route"""
+        raise NotImplementedError
+
+
+class FirebaseStorage(Storage):
+    """Firebase Realtime Database backend"""
+
+    name = "firebase"
+
+    def __init__(self, max_workers=HISTORY_FETCH_WORKERS):
+        import firebase_admin
+        from firebase_admin import credentials, db
+
+        # Initialize Firebase Admin SDK if not already initialized
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(FIREBASE_CREDENTIALS)
+            firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_DATABASE_URL})
+
+        self.db = db
+        self.max_workers = max_workers
+
+    def get_bins(self):
+        return self.db.reference("/bins").get() or {}
+
+    def get_bin(self, bin_id):
+        return self.db.reference(f"/bins/{bin_id}").get()
+
+    def set_bin(self, bin_id, data):
+        self.db.reference(f"/bins/{bin_id}").set(data)
+
+    def listen_bins(self, callback):
+        return self.db.reference("/bins").listen(callback)
+
+    def get_history(self, bin_id, limit=None):
+        ref = self.db.reference(f"/history/{bin_id}")
+        if limit:
+            return ref.order_by_key().limit_to_last(limit).get() or {}
+        return ref.get() or {}
+
+    def get_histories(self, bin_ids, limit):
+        """Fetch many bins' windows through a bounded thread pool"""
+        bin_ids = list(bin_ids)
+        start = time.perf_counter()
+
+        def fetch_one(bin_id):
+            return bin_id, history_to_points(self.get_history(bin_id, limit))
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            history_df = points_to_frame(executor.map(fetch_one, bin_ids))
+
+        history_df.attrs["fetch_stats"] = {
+            "requests": len(bin_ids),
+            "fetch_seconds": time.perf_counter() - start,
+        }
+        return history_df
+
+    def get_history_heads(self):
+        # Shallow listing for the ids; writers stamp /bins with every
+        # reading, so its timestamp is the last-write marker
+        bin_ids = self.db.reference("/history").get(shallow=True) or {}
+        bins = self.get_bins()
+        heads = {}
+        for bin_id in bin_ids:
+            state = bins.get(bin_id)
+            timestamp = state.get("timestamp") if isinstance(state, dict) else None
+            heads[bin_id] = None if timestamp is None else int(float(timestamp))
+        return heads
+
+    def get_history_since(self, bin_id, after=None, limit=None):
+        ref = self.db.reference(f"/history/{bin_id}")
+        if after is None and limit is None:
+            return ref.get() or {}
+        query = ref.order_by_key()
+        if after is not None:
+            # Keys are integer-second timestamps, so key order is time order
+            query = query.start_at(str(int(after) + 1))
+        if limit is not None:
+            query = query.limit_to_first(limit)
+        return query.get() or {}
+
+    def add_history(self, bin_id, timestamp, data):
+        self.db.reference(f"/history/{bin_id}/{timestamp}").set(data)
+
+    def set_history(self, bin_id, readings):
+        self.db.reference(f"/history/{bin_id}").set(readings)
+
+    def get_predictions(self):
+        return self.db.reference("/predictions").get() or {}
+
+    def update_predictions(self, updates):
+        self.db.reference("/predictions").update(updates)
+
+    def listen_predictions(self, callback):
+        return self.db.reference("/predictions").listen(callback)
+
+    def get_route(self, route_id):
+        return self.db.reference(f"/routes/{route_id}").get()
+
+    def set_route(self, route_id, data):
+        self.db.reference(f"/routes/{route_id}").set(data)
+
+    def get_route_ids(self):
+        return list(self.db.reference("/routes").get(shallow=True) or {})
+
+    def delete_route(self, route_id):
+        self.db.reference(f"/routes/{route_id}").delete()
+
+
+class _PollingListener:
+    """Background thread that turns SQLite bin versions into change events"""
+
+    def __init__(self, storage, callback, interval):
+        self.storage = storage
+        self.callback = callback
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        version = self.storage._bins_version()
+        self.callback(BinsEvent("put", "/", self.storage.get_bins()))
+        while not self.stopped.wait(self.interval):
+            changed, version = self.storage._bins_changed_since(version)
+            for bin_id, data in changed:
+                self.callback(BinsEvent("put", f"/{bin_id}", data))
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class SQLiteStorage(Storage):
+    """
+    Local backend on embedded SQLite. History is keyed by (bin_id, ts), so
+    last-N window reads are index range scans. path=":memory:" keeps
+    everything in RAM.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bins (
+            bin_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            version INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS bins_version ON bins (version);
+        CREATE TABLE IF NOT EXISTS history (
+            bin_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            fill_level REAL,
+            latitude REAL,
+            longitude REAL,
+            PRIMARY KEY (bin_id, ts)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS predictions (
+            bin_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS routes (
+            route_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path=SQLITE_PATH, poll_interval=POLL_INTERVAL):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    # --- Bins ---
+    def get_bins(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT bin_id, data FROM bins").fetchall()
+        return {bin_id: json.loads(data) for bin_id, data in rows}
+
+    def get_bin(self, bin_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM bins WHERE bin_id = ?", (bin_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_bin(self, bin_id, data):
+        self.set_bins({bin_id: data})
+
+    def set_bins(self, bins):
+        """Replace many bins' states in one transaction"""
+        with self.lock:
+            version = self._bins_version()
+            rows = [
+                (bin_id, json.dumps(data), version + i + 1)
+                for i, (bin_id, data) in enumerate(bins.items())
+            ]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO bins (bin_id, data, version) VALUES (?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+
+    def _bins_version(self):
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(version) FROM bins").fetchone()
+        return row[0] or 0
+
+    def _bins_changed_since(self, version):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT bin_id, data, version FROM bins WHERE version > ? ORDER BY version",
+                (version,),
+            ).fetchall()
+        if rows:
+            version = rows[-1][2]
+        return [(bin_id, json.loads(data)) for bin_id, data, _ in rows], version
+
+    def listen_bins(self, callback):
+        return _PollingListener(self, callback, self.poll_interval)
+
+    # --- History ---
+    @staticmethod
+    def _reading(fill_level, latitude, longitude):
+        return {"fill_level": fill_level, "latitude": latitude, "longitude": longitude}
+
+    def get_history(self, bin_id, limit=None):
+        query = (
+            "SELECT ts, fill_level, latitude, longitude FROM history "
+            "WHERE bin_id = ? ORDER BY ts DESC"
+        )
+        params = (bin_id,)
+        if limit:
+            query += " LIMIT ?"
+            params = (bin_id, limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return {str(ts): self._reading(*rest) for ts, *rest in reversed(rows)}
+
+    def get_histories(self, bin_ids, limit):
+        """One local read session: an index range scan per bin"""
+        bin_ids = list(bin_ids)
+        start = time.perf_counter()
+        query = (
+            "SELECT ts, fill_level FROM history "
+            "WHERE bin_id = ? ORDER BY ts DESC LIMIT ?"
+        )
+        bin_points = []
+        with self.lock:
+            for bin_id in bin_ids:
+                rows = self.conn.execute(query, (bin_id, limit)).fetchall()
+                points = [(ts, fill or 0.0) for ts, fill in reversed(rows)]
+                bin_points.append((bin_id, points))
+
+        history_df = points_to_frame(bin_points)
+        history_df.attrs["fetch_stats"] = {
+            "requests": 1,
+            "fetch_seconds": time.perf_counter() - start,
+        }
+        return history_df
+
+    def get_history_heads(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT bin_id, MAX(ts) FROM history GROUP BY bin_id"
+            ).fetchall()
+        return dict(rows)
+
+    def get_history_since(self, bin_id, after=None, limit=None):
+        after = float("-inf") if after is None else after
+        limit = -1 if limit is None else limit  # SQLite: negative means no limit
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT ts, fill_level, latitude, longitude FROM history "
+                "WHERE bin_id = ? AND ts > ? ORDER BY ts LIMIT ?",
+                (bin_id, after, limit),
+            ).fetchall()
+        return {str(ts): self._reading(*rest) for ts, *rest in rows}
+
+    def add_history(self, bin_id, timestamp, data):
+        self.add_history_rows(
+            [
+                (
+                    bin_id,
+                    int(float(timestamp)),
+                    data.get("fill_level"),
+                    data.get("latitude"),
+                    data.get("longitude"),
+                )
+            ]
+        )
+
+    def add_history_rows(self, rows):
+        """Bulk insert (bin_id, ts, fill_level, latitude, longitude) rows"""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self.conn.commit()
+
+    def set_history(self, bin_id, readings):
+        with self.lock:
+            self.conn.execute("DELETE FROM history WHERE bin_id = ?", (bin_id,))
+            self.add_history_rows(
+                [
+                    (
+                        bin_id,
+                        int(float(ts)),
+                        data.get("fill_level"),
+                        data.get("latitude"),
+                        data.get("longitude"),
+                    )
+                    for ts, data in readings.items()
+                ]
+            )
+
+    # --- Predictions ---
+    def get_predictions(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT bin_id, data FROM predictions").fetchall()
+        return {bin_id: json.loads(data) for bin_id, data in rows}
+
+    def update_predictions(self, updates):
+        # Group paths by bin so each touched prediction is rewritten once
+        by_bin = {}
+        for path, value in updates.items():
+            bin_id, _, field = path.strip("/").partition("/")
+            by_bin.setdefault(bin_id, {})[field] = value
+
+        with self.lock:
+            partial = [b for b, fields in by_bin.items() if "" not in fields]
+            existing = self._predictions_for(partial)
+
+            upserts, deletes = [], []
+            for bin_id, fields in by_bin.items():
+                if "" in fields:
+                    # Whole-entry write replaces the prediction
+                    node = fields.pop("")
+                    node = dict(node) if node is not None else None
+                else:
+                    node = json.loads(existing.get(bin_id, "{}"))
+                if node is not None and fields:
+                    apply_multipath_update(node, fields)
+                if node is None:
+                    deletes.append((bin_id,))
+                else:
+                    upserts.append((bin_id, json.dumps(node)))
+
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO predictions (bin_id, data) VALUES (?, ?)",
+                upserts,
+            )
+            self.conn.executemany("DELETE FROM predictions WHERE bin_id = ?", deletes)
+            self.conn.commit()
+
+    def _predictions_for(self, bin_ids, chunk_size=500):
+        """Return {bin_id: json} for the given bins, chunked under SQLite's variable limit"""
+        existing = {}
+        for i in range(0, len(bin_ids), chunk_size):
+            chunk = bin_ids[i : i + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            existing.update(
+                self.conn.execute(
+                    f"SELECT bin_id, data FROM predictions WHERE bin_id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+            )
+        return existing
+
+    # --- Routes ---
+    def get_route(self, route_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM routes WHERE route_id = ?", (route_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_route(self, route_id, data):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO routes (route_id, data) VALUES (?, ?)",
+                (route_id, json.dumps(data)),
+            )
+            self.conn.commit()
+
+    def get_route_ids(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT route_id FROM routes").fetchall()
+        return [row[0] for row in rows]
+
+    def delete_route(self, route_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM routes WHERE route_id = ?", (route_id,))
+            self.conn.commit()
+
+
+def create_storage(backend=None):
+    """Create a storage backend by name (firebase, sqlite or memory)"""
+    backend = backend or STORAGE_BACKEND
+    if backend == "firebase":
+        return FirebaseStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(SQLITE_PATH)
+    if backend == "memory":
+        return SQLiteStorage(":memory:")
+    raise ValueError(f"Unknown storage backend '{backend}'")
+
+
+def get_storage():
+    """Return the process-wide storage backend, creating it on first use"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage()
+            print(f"Using {_storage.name} storage")
+        return _storage
+
+
+def set_storage(storage):
+    """Replace the process-wide storage backend (e.g. an in-memory one for benchmarks)"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
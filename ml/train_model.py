@@ -13,6 +13,8 @@ import os
 import json
 from datetime import datetime
 
+import data_prep
+
 # Feature columns to use for training
 FEATURE_COLS = [
     "fill_level",
@@ -27,10 +29,17 @@ FEATURE_COLS = [
 TARGET_COL = "time_to_full_hours"
 
 
-def load_data(data_path="data/prepared_data.csv"):
-    """Load the prepared dataset"""
+def load_data(data_path=data_prep.PREPARED_DATA_DIR):
+    """
+    Load the prepared dataset: only the feature and target columns,
+    memory-mapped, from a partition directory (or a legacy CSV file)
+    """
     print(f"Loading data from {data_path}...")
-    df = pd.read_csv(data_path)
+    columns = FEATURE_COLS + [TARGET_COL]
+    if os.path.isdir(data_path):
+        df = data_prep.load_prepared_data(data_path, columns=columns, mmap_mode="r")
+    else:
+        df = pd.read_csv(data_path, usecols=columns)
     print(f"Loaded {len(df)} records")
     return df
 
@@ -39,15 +48,14 @@ def prepare_features(df):
     """Prepare features and target for training"""
     print("Preparing features and target...")
 
-    # Select feature columns
-    X = df[FEATURE_COLS].copy()
-    y = df[TARGET_COL].copy()
-
-    # Handle any remaining NaN values
-    X = X.fillna(0)
+    # Select feature columns into one float32 matrix (the forest's own
+    # dtype, so fitting does not convert it again)
+    X = np.column_stack([np.asarray(df[col], dtype=np.float32) for col in FEATURE_COLS])
+    y = df[TARGET_COL].to_numpy()
 
-    # Remove infinite values
-    X = X.replace([np.inf, -np.inf], 0)
+    # Handle any remaining NaN values and remove infinite values
+    np.nan_to_num(X, copy=False, nan=0, posinf=0, neginf=0)
+    X = pd.DataFrame(X, columns=FEATURE_COLS, copy=False)
 
     print(f"Feature matrix shape: {X.shape}")
     print(f"Target shape: {y.shape}")